@@ -0,0 +1,208 @@
+"""
+Benchmark StreamingTransfer against a local HTTP stand-in for Drive.
+
+    python -m internal.bench_transfer --files 8 --size-mb 256 --fail-rate 0.1
+
+The stand-in serves ranged downloads of generated content and accepts
+resumable uploads, checking offsets and content and discarding the bytes.
+With ``--fail-rate``, that share of requests fail: downloads with a 503 or
+a connection dropped halfway, uploads with a 503 after keeping half the
+chunk or with no answer until the client times out, so the retry and
+resume paths run.
+"""
+import argparse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import re
+import resource
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlparse
+import uuid
+
+from .datatypes import File, Unit
+from .transfer import StreamingTransfer
+
+
+PATTERN = bytes(range(256)) * 4096
+SIZES: dict[str, int] = {}
+SESSIONS: dict[str, list[int]] = {}
+FAULTS: Counter[str] = Counter()
+LOCK = threading.Lock()
+FAIL_RATE = 0.0
+# NOTE: A stalled upload answers after this long, past the read timeout.
+STALL = 2.0
+RANDOM = random.Random(0)
+
+
+def fail(kind: str) -> bool:
+    with LOCK:
+        failed = RANDOM.random() < FAIL_RATE
+        if failed:
+            FAULTS[kind] += 1
+    return failed
+
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def empty(self, status: int):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        file_id = urlparse(self.path).path.rsplit('/', 1)[-1]
+        size = SIZES[file_id]
+        match = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        start, end = (int(match[1]), int(match[2])) if match \
+            else (0, size - 1)
+        if self.headers.get("Accept-Encoding") != "identity":
+            with LOCK:
+                FAULTS["encoding not identity"] += 1
+        if fail("download 503"):
+            self.empty(503)
+            return
+        self.send_response(206)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if fail("download dropped"):
+            end = start + (end - start) // 2
+            self.close_connection = True
+        position = start
+        while position <= end:
+            offset = position % len(PATTERN)
+            piece = min(len(PATTERN) - offset, end - position + 1)
+            self.wfile.write(memoryview(PATTERN)[offset:offset + piece])
+            position += piece
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        session = uuid.uuid4().hex
+        with LOCK:
+            SESSIONS[session] = [
+                0, int(self.headers["X-Upload-Content-Length"])
+            ]
+        self.send_response(200)
+        self.send_header(
+            "Location", f"http://{self.headers['Host']}/session/{session}"
+        )
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_PUT(self):
+        session = urlparse(self.path).path.rsplit('/', 1)[-1]
+        received, size = SESSIONS[session]
+        length = int(self.headers.get("Content-Length", 0))
+        match = re.match(r"bytes (\d+)-(\d+)/\d+",
+                         self.headers.get("Content-Range", ""))
+        if match and int(match[1]) != received:
+            self.rfile.read(length)
+            self.empty(400)
+            return
+        # NOTE: On a failure keep only the first half, as a dropped
+        # upload would, and let the client ask where to resume.
+        failed = length > 1 and fail("upload 503")
+        keep = length // 2 if failed else length
+        position = received
+        remaining = length
+        while remaining:
+            offset = position % len(PATTERN)
+            piece = self.rfile.read(min(remaining, len(PATTERN) - offset))
+            if position < received + keep and \
+                    piece != PATTERN[offset:offset + len(piece)]:
+                with LOCK:
+                    FAULTS["corrupt upload"] += 1
+            position += len(piece)
+            remaining -= len(piece)
+        received += keep
+        SESSIONS[session][0] = received
+        if failed:
+            self.empty(503)
+            return
+        if length and fail("upload stalled"):
+            time.sleep(STALL)
+            self.close_connection = True
+            return
+        if received >= size:
+            body = b'{"id": "%s"}' % session.encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(308)
+        if received:
+            self.send_header("Range", f"bytes=0-{received - 1}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--chunk-mb", type=int, default=32)
+    parser.add_argument("--max-files", type=int, default=4)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    global FAIL_RATE
+    FAIL_RATE = args.fail_rate
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    files = []
+    for n in range(args.files):
+        SIZES[f"f{n}"] = args.size_mb * Unit.MB
+        files.append((File(
+            id=f"f{n}", name=f"f{n}", mimeType="application/octet-stream",
+            size=args.size_mb * Unit.MB, parents=["src"]
+        ), "dst"))
+
+    tracemalloc.start()
+    engine = StreamingTransfer(
+        chunk_size=args.chunk_mb * Unit.MB,
+        max_files=args.max_files,
+        drive_url=f"{base}/drive/v3",
+        upload_url=f"{base}/upload/drive/v3",
+        backoff=0.01,
+        timeout=(5.0, STALL / 2),
+    )
+    start = time.perf_counter()
+    try:
+        results = engine.copy(files)
+    finally:
+        engine.close()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    server.shutdown()
+
+    total = sum(result.size for result in results)
+    assert all(result.destination for result in results), "Upload failed."
+    assert all(received == size for received, size in SESSIONS.values()), \
+        "Upload incomplete."
+    assert not FAULTS["corrupt upload"], "Uploaded content differs."
+    assert not FAULTS["encoding not identity"], "Download not identity."
+    print(f"files={len(results)} total={total / Unit.MB:.0f} MB "
+          f"time={seconds:.2f} s "
+          f"throughput={total / Unit.MB / seconds:.1f} MB/s")
+    print(f"buffers={2 * args.max_files * args.chunk_mb} MB "
+          f"peak traced={peak / Unit.MB:.1f} MB "
+          f"max rss={resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    if FAIL_RATE:
+        print("faults injected: " + ", ".join(
+            f"{kind}={count}" for kind, count in sorted(FAULTS.items())
+        ))
+
+
+if __name__ == '__main__':
+    main()
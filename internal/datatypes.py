@@ -8,6 +8,7 @@ from typing import (
     Generic,
     Literal,
     NamedTuple,
+    Optional,
     ParamSpec,
     TypeAlias,
     TypeVar,
@@ -80,12 +81,15 @@ columns = [
 @dataclass(kw_only=True)
 class SupportRich:
     console: Console = Console()
+    # NOTE: Coalesce progress updates, rendering on every advance is slow.
+    refresh_per_second: float = 2
 
     def __post_init__(self):
         self.progress = Progress(
             *columns,
             console=self.console,
             transient=False,
+            refresh_per_second=self.refresh_per_second,
         )
 
 
@@ -143,6 +147,7 @@ class File(BaseModel, extra=Extra.ignore):
     mimeType: str
     size: int
     parents: list[str]
+    md5Checksum: Optional[str] = None
 
     def __hash__(self):
         return hash(self.id)
@@ -0,0 +1,147 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from fnmatch import fnmatchcase
+from typing import Optional
+
+from .datatypes import FOLDER_MIME_TYPE, File, Folder, Item
+
+
+__all__ = (
+    "ItemFilter",
+    "escape",
+)
+
+
+def escape(name: str) -> str:
+    """
+    Escape a name for use inside a quoted ``q`` string.
+    """
+    return name.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def rfc3339(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+@dataclass(frozen=True)
+class ItemFilter:
+    """
+    Which items to keep while listing, searching and clustering.
+
+    Names, mimeTypes, modified time and trashed state are pushed into the
+    Drive ``q`` string, so excluded items are never fetched. Globs and size
+    bounds are not expressible in ``q`` and are checked by ``matches``.
+
+    Only names and trashed state apply to folders, the rest are a file's.
+    A folder is judged by the files it keeps, through a snapshot listed
+    with the same filter.
+    """
+    exclude_names: frozenset[str] = field(default_factory=frozenset)
+    exclude_globs: tuple[str, ...] = ()
+    mime_types: frozenset[str] = field(default_factory=frozenset)
+    exclude_mime_types: frozenset[str] = field(default_factory=frozenset)
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    modified_after: Optional[datetime] = None
+    modified_before: Optional[datetime] = None
+    trashed: Optional[bool] = False
+
+    def query(self) -> str:
+        """
+        Return the ``q`` clauses for this filter, empty if none apply.
+        """
+        return " and ".join(self._folder_clauses() + self._file_clauses())
+
+    def folder_query(self) -> str:
+        """
+        Return the ``q`` clauses which apply to folders, for walking a tree.
+
+        mimeTypes and modified time are a file's, a folder's own say nothing
+        about what is inside it.
+        """
+        return " and ".join(self._folder_clauses())
+
+    def item_query(self) -> str:
+        """
+        Return the ``q`` clauses for a folder's mixed contents.
+
+        Subfolders are kept by ``folder_query``, files by ``query``.
+        """
+        clauses = self._folder_clauses()
+        files = self._file_clauses()
+        if files:
+            clauses.append(
+                f"(mimeType = '{FOLDER_MIME_TYPE}' or ("
+                + " and ".join(files) + "))"
+            )
+        return " and ".join(clauses)
+
+    def _file_clauses(self) -> list[str]:
+        clauses = []
+        if self.mime_types:
+            clauses.append("(" + " or ".join(
+                f"mimeType = '{mime}'" for mime in sorted(self.mime_types)
+            ) + ")")
+        clauses.extend(
+            f"mimeType != '{mime}'" for mime in sorted(self.exclude_mime_types)
+        )
+        if self.modified_after is not None:
+            clauses.append(f"modifiedTime > '{rfc3339(self.modified_after)}'")
+        if self.modified_before is not None:
+            clauses.append(
+                f"modifiedTime < '{rfc3339(self.modified_before)}'"
+            )
+        return clauses
+
+    def _folder_clauses(self) -> list[str]:
+        clauses = [
+            f"name != '{escape(name)}'" for name in sorted(self.exclude_names)
+        ]
+        if self.trashed is not None:
+            clauses.append(f"trashed = {str(self.trashed).lower()}")
+        return clauses
+
+    def and_query(self, query: str, *, folders: bool = False) -> str:
+        """
+        Combine an existing query with this filter's clauses.
+
+        With ``folders``, subfolders are kept by name only.
+        """
+        pushed = self.item_query() if folders else self.query()
+        if not pushed:
+            return query
+        if not query:
+            return pushed
+        return f"({query}) and {pushed}"
+
+    def excludes_name(self, name: str) -> bool:
+        return name in self.exclude_names or any(
+            fnmatchcase(name, glob) for glob in self.exclude_globs
+        )
+
+    def matches(self, item: Item, size: Optional[int] = None) -> bool:
+        """
+        Check the parts of the filter which can't be pushed to the server.
+
+        Names and mimeTypes are checked again, for listings which don't take
+        a query. ``size`` defaults to the file size. Folders are only checked
+        by name.
+        """
+        if self.excludes_name(item.name):
+            return False
+        if isinstance(item, Folder):
+            return True
+        if self.mime_types and item.mimeType not in self.mime_types:
+            return False
+        if item.mimeType in self.exclude_mime_types:
+            return False
+        if size is None and isinstance(item, File):
+            size = item.size
+        if size is not None:
+            if self.min_size is not None and size < self.min_size:
+                return False
+            if self.max_size is not None and size > self.max_size:
+                return False
+        return True
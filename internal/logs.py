@@ -0,0 +1,71 @@
+from collections import Counter
+import json
+from pathlib import Path
+import queue
+import threading
+import time
+from typing import Any, Optional
+
+
+__all__ = (
+    "StructuredLog",
+)
+
+
+class StructuredLog:
+    """
+    JSON-lines event log written from a background thread.
+
+    ``write`` only enqueues, so hot loops never block on disk. The writer
+    thread, and with it the open file, starts with the first event and
+    ends with ``close``. Every event is also counted per ``(stage, event)``
+    for a summary at the end.
+    """
+
+    def __init__(self, path: Optional[str | Path] = 'drive.log.jsonl'):
+        self.path = None if path is None else Path(path).expanduser()
+        self.counts: Counter[tuple[str, str]] = Counter()
+        self._lock = threading.Lock()
+        self._queue: queue.SimpleQueue[Optional[dict[str, Any]]] = \
+            queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+    def _drain(self):
+        assert self.path is not None
+        with open(self.path, 'a', encoding='utf-8') as fh:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    break
+                fh.write(json.dumps(record, default=str))
+                fh.write('\n')
+
+    def write(self, stage: str, event: str, **fields: Any):
+        with self._lock:
+            self.counts[stage, event] += 1
+            if self.path is not None and self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._drain, name="structured-log", daemon=True
+                )
+                self._writer.start()
+        if self.path is not None:
+            self._queue.put(
+                {"ts": time.time(), "stage": stage, "event": event, **fields}
+            )
+
+    def summary(self) -> dict[str, dict[str, int]]:
+        """
+        Return event counts grouped by stage.
+        """
+        stages: dict[str, dict[str, int]] = {}
+        with self._lock:
+            for (stage, event), count in sorted(self.counts.items()):
+                stages.setdefault(stage, {})[event] = count
+        return stages
+
+    def close(self):
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._queue.put(None)
+            writer.join()
@@ -1,9 +1,21 @@
+from contextlib import ExitStack, nullcontext
 import sys
+import time
 from .datatypes import Item, Unit, Cluster
-from .service import DriveService, size_on_disk
+from .filters import ItemFilter
+from .manifest import Manifest
+from .planner import Measurements, plan, print_plan
+from .profiling import Profiler
+from .quota import QuotaLedger, schedule_transfer
+from .service import DriveService, categorize, size_on_disk
+from .sharding import DestinationShards
+from .snapshot import TreeSnapshot
+from .tuning import TuningHistory, tune
+from .workqueue import ClusterQueue
 
 
 TEST = CLUSTER = NEW_FOLDER = MOVE = COPY = DELETE = REVIEW = PERMISSION = 0
+PROFILE = QUEUE = PLAN = 0
 
 if __name__ == '__main__':
     # main()
@@ -14,8 +26,28 @@ if __name__ == '__main__':
     SOURCE, HR_NAME, cluster_prepend, dp = "1JM4RkZxbV65gDGFVWvqRiCL_lpD-EuVA", "KG Freeleech", 'KG', 'Films'
     SOURCE, HR_NAME, cluster_prepend, dp = "1uo8fbXVIfx3DLQAP1Q60lpEumzGISpBw", "Films", 'Films', 'BGFA_Films'
     SOURCE, HR_NAME, cluster_prepend, dp = "1XvhVCE1s1uRZgx3fFTnKITPTXszVZ1eC", "Series", 'Series', 'BGFA_Series'
-    DEST = "0AEaJmSa7kQbMUk9PVA"
-    copy_log = 'copy.log'
+    # NOTE: Clusters are spread over these shared drives, see sharding.py.
+    DESTS = ["0AEaJmSa7kQbMUk9PVA"]
+    manifest_path = f'{cluster_prepend}.manifest.jsonl'
+    snapshot_path = f'{cluster_prepend}.snapshot'
+    # NOTE: Must be on storage shared by all hosts, with the manifests.
+    queue_path = 'clusters.sqlite'
+    SA_BEGIN, SA_END = 1, 600
+    EXCLUDE = frozenset({
+        "Series_1", "Films_1", "Films_2", "Films_3", "Films_4"
+    })
+
+    ledger = QuotaLedger.load('quota.json')
+    transfer_plan = schedule_transfer(
+        ledger,
+        sa_begin=SA_BEGIN,
+        sa_end=SA_END,
+        max_cluster_size=MAX_CLUSTER_SIZE
+    )
+    if transfer_plan is None:
+        print("Daily quota exhausted for all service accounts.")
+        sys.exit(1)
+    MAX_CLUSTER_SIZE, SA_BEGIN, SA_END = transfer_plan
 
     # TEST = True
     # CLUSTER = True
@@ -25,8 +57,31 @@ if __name__ == '__main__':
     COPY = True
     REVIEW = True
     # DELETE = True
+    # PROFILE = True
+    # NOTE: With CLUSTER, plan all clusters into the queue and exit.
+    # Without, lease the next planned cluster and work on it.
+    # QUEUE = True
+    # NOTE: Dry run from the snapshot saved by CLUSTER, no API calls.
+    # PLAN = True
+
+    if PLAN:
+        print_plan(plan(
+            TreeSnapshot.load(snapshot_path),
+            upper_limit=MAX_CLUSTER_SIZE,
+            prefix=cluster_prepend,
+            exclude=set(EXCLUDE),
+            measured=Measurements.load()
+        ))
+        sys.exit(0)
+
+    shards = DestinationShards(DESTS, queue_path)
+    profiler = Profiler() if PROFILE else None
+    stage = profiler.stage if profiler is not None else nullcontext
 
-    with DriveService() as gdrive:
+    with DriveService(profiler=profiler) as gdrive, ExitStack() as stack:
+        # NOTE: Only with an AutoRclone which forwards the manifest and
+        # tuning flags to rclone.
+        # gdrive.autorclone_extensions = True
         # initial values
         # WARNING: Make sure new_folder is updated (if NEW_FOLDER==False)
         new_folder = "163orvcimW2p8tcoqS0X_DlrZuP-Yjfxt"
@@ -34,8 +89,12 @@ if __name__ == '__main__':
         cluster_name = f'{cluster_prepend}_1'
         cluster: Cluster[Item] = Cluster()
         all_copied = False
-        size_hint = None
-        tot = None
+        lease = None
+
+        # NOTE: Count what is already on the destinations once, CLUSTER
+        # recounts them all, copies made since add to the counts.
+        for drive in DESTS if CLUSTER else shards.uncounted():
+            shards.set_count(drive, gdrive.count_items(drive))
 
         if TEST:
             resp = gdrive.service.files().list(
@@ -43,6 +102,23 @@ if __name__ == '__main__':
                 fields="nextPageToken, files(id,name, parents, mimeType, size)"
             ).execute().get('files', [])
 
+        if QUEUE and not CLUSTER:
+            queue = ClusterQueue(queue_path)
+            lease = queue.acquire()
+            if lease is None:
+                gdrive.progress.log(f"No clusters left: {queue.counts()}")
+                sys.exit(0)
+            # NOTE: Released on error, completed when all stages succeed.
+            stack.enter_context(queue.hold(lease))
+            cluster_name = lease.name
+            manifest_path = lease.payload['manifest']
+            cluster = Cluster(
+                [categorize(item) for item in lease.payload['items']],
+                lease.payload['size'],
+                len(lease.payload['items'])
+            )
+            gdrive.progress.log(f"Leased {cluster_name}: {cluster}")
+
         if not NEW_FOLDER:
             gdrive.progress.log("NEW_FOLDER is False")
             gdrive.progress.log(f"Current value of {new_folder=}")
@@ -58,50 +134,103 @@ if __name__ == '__main__':
                 sys.exit(1)
 
         if CLUSTER:
-            items = gdrive.list_dir(SOURCE, log=True)
-            exclude = {"Series_1", "Films_1", "Films_2", "Films_3", "Films_4"}
-            clusters = gdrive.make_cluster(
-                items,
-                upper_limit=MAX_CLUSTER_SIZE,
-                exclude=exclude
-            )
-            cluster = next(clusters)
-            with open(copy_log, 'w+') as fh:
-                for item in cluster:
-                    fh.write(f'{HR_NAME}::{cluster_prepend}::{item.name}\n')
-            gdrive.progress.log(
-                f"Current cluster: {cluster}"
-            )
-            tot = cluster.nitems
-            size_hint = cluster.size
+            with stage("CLUSTER"):
+                where = ItemFilter(exclude_names=EXCLUDE)
+                snapshot = gdrive.snapshot(SOURCE, where=where, path=snapshot_path)
+                items = gdrive.list_dir(SOURCE, where=where, log=True)
+                clusters = gdrive.make_cluster(
+                    items,
+                    upper_limit=MAX_CLUSTER_SIZE,
+                    max_clusters=max(len(items), 1) if QUEUE else 1,
+                    snapshot=snapshot,
+                    where=where
+                )
+                if QUEUE:
+                    queue = ClusterQueue(queue_path)
+                    for n, cluster in enumerate(clusters, start=1):
+                        name = f'{cluster_prepend}_{n}'
+                        path = f'{name}.manifest.jsonl'
+                        Manifest.from_cluster(name, cluster, snapshot).save(
+                            path
+                        )
+                        queue.put(name, {
+                            "manifest": path,
+                            "size": cluster.size,
+                            "items": [item.dict() for item in cluster],
+                        })
+                    gdrive.progress.log(f"Queued clusters: {queue.counts()}")
+                    sys.exit(0)
+                cluster = next(clusters)
+                Manifest.from_cluster(cluster_name, cluster, snapshot).save(
+                    manifest_path
+                )
+                gdrive.progress.log(
+                    f"Current cluster: {cluster}"
+                )
 
         if NEW_FOLDER:
-            new_folder = gdrive.create_folder(
-                cluster_name,
-                destination=SOURCE
-            ).id
+            with stage("NEW_FOLDER"):
+                new_folder = gdrive.create_folder(
+                    cluster_name,
+                    destination=SOURCE
+                ).id
+                Manifest.load(manifest_path).attach(new_folder)
 
+        # NOTE: Stop before each stage once another worker may have the
+        # cluster.
+        if lease is not None:
+            lease.check()
         if MOVE:
-            gdrive.move(cluster, destination=new_folder)
+            with stage("MOVE"):
+                gdrive.move(cluster, destination=new_folder)
 
+        if lease is not None:
+            lease.check()
         if PERMISSION:
-            gdrive.update_permission_recursively(new_folder, total=tot)
+            with stage("PERMISSION"):
+                gdrive.update_permission_recursively(new_folder)
 
+        if lease is not None:
+            lease.check()
         if COPY:
-            # if not CLUSTER:
-            #     new_folder_ = gdrive.search_by_id(new_folder)
-            #     size_hint = sum(size_on_disk(new_folder_, per_item=True))
-            #     new_folder = new_folder_.id
-            # size_hint = int(25.7 * Unit.GB)
-            gdrive.copy(source=new_folder, destination=DEST, dest_path=dp,
-                        port="5572", size_hint=size_hint, timeout=900)
+            with stage("COPY"):
+                manifest = gdrive.cluster_metadata(new_folder) \
+                    or Manifest.load(manifest_path)
+                history = TuningHistory.load('tuning.jsonl')
+                profile, tuning = tune(
+                    (entry.size for entry in manifest), history=history,
+                    ledger=ledger, sa_range=(SA_BEGIN, SA_END)
+                )
+                gdrive.progress.log(f"Rclone settings: {profile=}, {tuning=}")
+                destination = shards.assign(new_folder, manifest.nitems)
+                if destination is None:
+                    gdrive.progress.log("[red]No destination has room.")
+                    sys.exit(1)
+                start = time.perf_counter()
+                copied = gdrive.copy(source=new_folder, destination=destination,
+                                     dest_path=dp, port="5572", timeout=900,
+                                     sa_begin=SA_BEGIN, sa_end=SA_END,
+                                     ledger=ledger, manifest=manifest,
+                                     tuning=tuning)
+                # NOTE: Without the extensions rclone ran with its own
+                # settings, not these.
+                if gdrive.autorclone_extensions:
+                    history.record(profile, tuning, nbytes=copied,
+                                   nfiles=len(manifest),
+                                   seconds=time.perf_counter() - start)
 
+        if lease is not None:
+            lease.check()
         if REVIEW:
-            stats = all_copied, *_ = gdrive.review_copy(
-                source=new_folder,
-                destination=DEST
-            )
+            with stage("REVIEW"):
+                stats = all_copied, *_ = gdrive.review_copy(
+                    source=new_folder,
+                    # NOTE: Clusters copied before sharding went to the
+                    # first destination.
+                    destination=shards.destination(new_folder, DESTS[0])
+                )
 
         if DELETE:
-            if all_copied:
-                gdrive.delete(new_folder)
+            with stage("DELETE"):
+                if all_copied:
+                    gdrive.delete(new_folder)
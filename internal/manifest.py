@@ -0,0 +1,149 @@
+from dataclasses import dataclass, field
+import json
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Iterable, NamedTuple, Optional
+
+from .datatypes import Cluster, File, Item, ItemID
+
+if TYPE_CHECKING:
+    from .snapshot import TreeSnapshot
+
+
+__all__ = (
+    "ManifestEntry",
+    "Manifest",
+)
+
+# NOTE: Manifests of created cluster folders, named by folder id.
+CLUSTER_DIR = Path('clusters')
+
+
+class ManifestEntry(NamedTuple):
+    id: ItemID
+    path: PurePosixPath
+    size: int
+
+
+@dataclass
+class Manifest:
+    """
+    Exact list of files in a cluster, paths relative to the cluster folder.
+
+    Once the cluster folder exists, ``attach`` saves the manifest under its
+    id, so later stages get counts and sizes without listing it again.
+    """
+    name: str
+    entries: list[ManifestEntry] = field(default_factory=list)
+    folder: Optional[ItemID] = None
+
+    @classmethod
+    def from_cluster(
+        cls,
+        name: str,
+        cluster: Cluster[Item] | Iterable[Item],
+        snapshot: 'TreeSnapshot'
+    ) -> 'Manifest':
+        entries = []
+        for item in cluster:
+            if isinstance(item, File):
+                entries.append(
+                    ManifestEntry(item.id, PurePosixPath(item.name), item.size)
+                )
+            else:
+                entries.extend(
+                    ManifestEntry(*entry)
+                    for entry in snapshot.files_under(item.id)
+                )
+        return cls(name, entries)
+
+    @property
+    def total_size(self) -> int:
+        return sum(entry.size for entry in self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def nfolders(self) -> int:
+        """
+        Number of folders the files sit in, the cluster folder excluded.
+        """
+        return len({
+            parent for entry in self.entries for parent in entry.path.parents
+        } - {PurePosixPath('.')})
+
+    @property
+    def nitems(self) -> int:
+        return len(self) + self.nfolders
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def save(self, path: str | Path):
+        """
+        Save as JSON lines, first line is the header.
+        """
+        with open(Path(path).expanduser(), 'w', encoding='utf-8') as fh:
+            header = {
+                "name": self.name,
+                "folder": self.folder,
+                "nfiles": len(self),
+                "nitems": self.nitems,
+                "size": self.total_size
+            }
+            fh.write(json.dumps(header) + '\n')
+            for entry in self.entries:
+                fh.write(json.dumps(
+                    {"id": entry.id, "path": str(entry.path),
+                     "size": entry.size}
+                ) + '\n')
+
+    @classmethod
+    def load(cls, path: str | Path) -> 'Manifest':
+        with open(Path(path).expanduser(), encoding='utf-8') as fh:
+            header = json.loads(next(fh))
+            entries = [
+                ManifestEntry(
+                    record['id'], PurePosixPath(record['path']),
+                    record['size']
+                )
+                for record in map(json.loads, fh)
+            ]
+        return cls(header['name'], entries, header.get('folder'))
+
+    def attach(
+        self,
+        folder: ItemID,
+        directory: str | Path = CLUSTER_DIR
+    ) -> Path:
+        """
+        Record the cluster folder and save alongside other clusters.
+        """
+        self.folder = folder
+        path = Path(directory).expanduser()
+        path.mkdir(parents=True, exist_ok=True)
+        path /= f"{folder}.manifest.jsonl"
+        self.save(path)
+        return path
+
+    @classmethod
+    def for_folder(
+        cls,
+        folder: ItemID,
+        directory: str | Path = CLUSTER_DIR
+    ) -> Optional['Manifest']:
+        """
+        Load the manifest attached to a cluster folder, if any.
+        """
+        path = Path(directory).expanduser() / f"{folder}.manifest.jsonl"
+        return cls.load(path) if path.exists() else None
+
+    def write_files_from(self, path: str | Path) -> Path:
+        """
+        Write paths one per line, for rclone's ``--files-from-raw``.
+        """
+        path = Path(path).expanduser()
+        with open(path, 'w', encoding='utf-8') as fh:
+            for entry in self.entries:
+                fh.write(f"{entry.path}\n")
+        return path
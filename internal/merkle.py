@@ -0,0 +1,105 @@
+from hashlib import sha1
+from pathlib import PurePosixPath
+from typing import Iterable, NamedTuple
+
+from .datatypes import File
+from .tree import FolderIndex
+
+
+__all__ = (
+    "FolderDigest",
+    "TreeDigest",
+    "diff_trees",
+)
+
+ROOT = PurePosixPath('.')
+
+
+class FolderDigest(NamedTuple):
+    count: int
+    size: int
+    digest: str
+
+
+class TreeDigest:
+    """
+    Per-folder digests of a listed tree, keyed by path relative to root.
+
+    A folder's digest covers file count, total size and a hash over the
+    sorted ``(name, size, md5)`` of its files and the digests of its
+    sub-folders, so equal digests mean equal subtrees.
+    """
+
+    def __init__(self, files: Iterable[File], index: FolderIndex):
+        self.files: dict[PurePosixPath, list[File]] = {
+            path: [] for path in index.paths.values()
+        }
+        for file in files:
+            self.files[index.path(index.parent(file))].append(file)
+
+        self.children: dict[PurePosixPath, list[PurePosixPath]] = {
+            path: [] for path in self.files
+        }
+        for path in self.files:
+            if path != ROOT:
+                self.children[path.parent].append(path)
+
+        self.digests: dict[PurePosixPath, FolderDigest] = {}
+        for path in sorted(self.files, key=lambda p: -len(p.parts)):
+            self.digests[path] = self._digest(path)
+
+    def _digest(self, path: PurePosixPath) -> FolderDigest:
+        count = 0
+        size = 0
+        hasher = sha1()
+        for name, fsize, md5 in sorted(
+            (file.name, file.size, file.md5Checksum or '')
+            for file in self.files[path]
+        ):
+            count += 1
+            size += fsize
+            hasher.update(f"F\0{name}\0{fsize}\0{md5}\n".encode())
+        for child in sorted(self.children[path]):
+            sub = self.digests[child]
+            count += sub.count
+            size += sub.size
+            hasher.update(f"D\0{child.name}\0{sub.digest}\n".encode())
+        return FolderDigest(count, size, hasher.hexdigest())
+
+    def __getitem__(self, path: PurePosixPath) -> FolderDigest:
+        return self.digests[path]
+
+
+def diff_trees(source: TreeDigest, destination: TreeDigest) -> list[File]:
+    """
+    Return source files missing or different in destination.
+
+    Trees are compared top-down, descending only where digests differ.
+    """
+    missing: list[File] = []
+    pending = [ROOT]
+    while pending:
+        path = pending.pop()
+        expected = source.digests[path]
+        if destination.digests.get(path) == expected:
+            continue
+        if path not in destination.digests:
+            missing.extend(all_files(source, path))
+            continue
+        present = {
+            (file.name, file.size, file.md5Checksum)
+            for file in destination.files[path]
+        }
+        missing.extend(
+            file for file in source.files[path]
+            if (file.name, file.size, file.md5Checksum) not in present
+        )
+        pending.extend(source.children[path])
+    return missing
+
+
+def all_files(tree: TreeDigest, path: PurePosixPath) -> list[File]:
+    files = list(tree.files[path])
+    for child in tree.children[path]:
+        files.extend(all_files(tree, child))
+    return files
@@ -0,0 +1,235 @@
+from dataclasses import dataclass, field
+import json
+from math import ceil
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+from .datatypes import Unit, format_size
+from .quota import DAILY_QUOTA
+from .snapshot import TreeSnapshot
+from .tuning import TuningHistory, size_class
+
+
+__all__ = (
+    "Measurements",
+    "StageEstimate",
+    "ClusterPlan",
+    "plan",
+    "print_plan",
+)
+
+# NOTE: Used until a profiled or recorded run has measured better ones.
+DEFAULT_LATENCY: float = 0.3
+DEFAULT_THROUGHPUT: float = 50 * Unit.MB
+LISTING_PAGE: int = 1000
+
+
+@dataclass
+class Measurements:
+    """
+    API latency and copy throughput measured in previous runs.
+    """
+    latency: float = DEFAULT_LATENCY
+    throughput: dict[str, float] = field(default_factory=dict)
+    workers: int = 8
+
+    @classmethod
+    def load(
+        cls,
+        stages: str | Path = 'profile/stages.json',
+        history: str | Path = 'tuning.jsonl',
+        workers: int = 8
+    ) -> 'Measurements':
+        latency = DEFAULT_LATENCY
+        stages = Path(stages).expanduser()
+        if stages.exists():
+            with open(stages, encoding='utf-8') as fh:
+                report = json.load(fh)
+            wait = sum(stage['api_wait'] for stage in report.values())
+            calls = sum(stage['api_calls'] for stage in report.values())
+            if calls:
+                latency = wait / calls
+        throughput: dict[str, list[float]] = {}
+        for record in TuningHistory.load(history).records:
+            if record['throughput'] > 0:
+                throughput.setdefault(record['profile'], []).append(
+                    record['throughput']
+                )
+        return cls(
+            latency,
+            {key: sum(vals) / len(vals) for key, vals in throughput.items()},
+            workers
+        )
+
+    def copy_rate(self, profile: str) -> float:
+        return self.throughput.get(profile, DEFAULT_THROUGHPUT)
+
+
+class StageEstimate(NamedTuple):
+    name: str
+    api_calls: int
+    seconds: float
+    upload: int = 0
+
+
+@dataclass
+class ClusterPlan:
+    name: str
+    items: list[str]
+    size: int
+    nfiles: int
+    nfolders: int
+    stages: list[StageEstimate] = field(default_factory=list)
+
+    @property
+    def api_calls(self) -> int:
+        return sum(stage.api_calls for stage in self.stages)
+
+    @property
+    def seconds(self) -> float:
+        return sum(stage.seconds for stage in self.stages)
+
+
+def _subtree_counts(snapshot: TreeSnapshot, position: int) -> tuple[int, int]:
+    files = folders = 0
+    pending = [position]
+    while pending:
+        node = pending.pop()
+        if snapshot.is_folder[node]:
+            folders += 1
+            pending.extend(snapshot.children(node))
+        else:
+            files += 1
+    return files, folders
+
+
+def estimate_stages(
+    cluster: ClusterPlan,
+    file_sizes: list[int],
+    measured: Measurements,
+    *,
+    merkle: bool = True
+) -> list[StageEstimate]:
+    """
+    Estimate API calls, upload and wall time of each stage for a cluster.
+    """
+    latency = measured.latency
+    parallel = latency / measured.workers
+    ntop = len(cluster.items)
+    nitems = cluster.nfiles + cluster.nfolders
+    listings = cluster.nfolders + ceil(cluster.nfiles / LISTING_PAGE)
+
+    profile = size_class(file_sizes)
+    if merkle:
+        review_calls = 2 * listings
+    else:
+        # NOTE: Roughly 40 names fit in one bulk query.
+        review_calls = listings + ceil(cluster.nfiles / 40)
+
+    return [
+        StageEstimate("NEW_FOLDER", 1, latency),
+        StageEstimate("MOVE", ntop, ntop * parallel),
+        StageEstimate(
+            "PERMISSION", 1 + nitems + listings,
+            latency + nitems * parallel + listings * latency
+        ),
+        StageEstimate(
+            "COPY", cluster.nfiles + cluster.nfolders,
+            cluster.size / measured.copy_rate(profile),
+            upload=cluster.size
+        ),
+        StageEstimate("REVIEW", review_calls, review_calls * latency),
+        StageEstimate("DELETE", 1, latency),
+    ]
+
+
+def plan(
+    snapshot: TreeSnapshot,
+    *,
+    upper_limit: int,
+    prefix: str,
+    exclude: set[str] = set(),
+    measured: Optional[Measurements] = None,
+    max_clusters: Optional[int] = None
+) -> list[ClusterPlan]:
+    """
+    Build clusters from a saved snapshot and estimate their cost.
+
+    Clusters are built greedily from the root's children, as make_cluster
+    does, without any API calls.
+    """
+    measured = measured or Measurements()
+    totals = snapshot.totals
+    plans: list[ClusterPlan] = []
+    current: list[int] = []
+    size = 0
+
+    def close():
+        files = folders = 0
+        for position in current:
+            nfiles, nfolders = _subtree_counts(snapshot, position)
+            files += nfiles
+            folders += nfolders
+        cluster = ClusterPlan(
+            f"{prefix}_{len(plans) + 1}",
+            [snapshot.id_of(position) for position in current],
+            size, files, folders
+        )
+        file_sizes = [
+            file_size
+            for position in current
+            for _, _, file_size in snapshot.files_under(
+                snapshot.id_of(position)
+            )
+        ]
+        cluster.stages = estimate_stages(cluster, file_sizes, measured)
+        plans.append(cluster)
+
+    for position in snapshot.children(snapshot.root):
+        if snapshot.name_of(position) in exclude:
+            continue
+        item_size = int(totals[position])
+        if current and size + item_size > upper_limit:
+            close()
+            if max_clusters is not None and len(plans) >= max_clusters:
+                return plans
+            current, size = [], 0
+        current.append(position)
+        size += item_size
+    if current:
+        close()
+    return plans
+
+
+def print_plan(plans: list[ClusterPlan], console: Optional[Console] = None):
+    console = console or Console()
+    for cluster in plans:
+        table = Table(
+            title=(
+                f"{cluster.name}: {len(cluster.items)} items, "
+                f"{cluster.nfiles} files, {cluster.nfolders} folders, "
+                "{size:.3f} {unit!r}".format(**format_size(cluster.size))
+            )
+        )
+        table.add_column("Stage")
+        table.add_column("API calls", justify="right")
+        table.add_column("Upload", justify="right")
+        table.add_column("Wall time", justify="right")
+        for stage in cluster.stages:
+            table.add_row(
+                stage.name,
+                str(stage.api_calls),
+                "{size:.2f} {unit!r}".format(**format_size(stage.upload)),
+                f"{stage.seconds / 3600:.2f} h",
+            )
+        console.print(table)
+    total_upload = sum(cluster.size for cluster in plans)
+    console.print(
+        f"Total: {len(plans)} clusters, "
+        f"{sum(cluster.api_calls for cluster in plans)} API calls, "
+        f"{sum(cluster.seconds for cluster in plans) / 3600:.2f} h, "
+        f"{ceil(total_upload / DAILY_QUOTA)} service account days of upload."
+    )
@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+import json
+import threading
+from typing import Callable, Iterable, Optional, TypeVar
+
+import google_auth_httplib2    # type: ignore
+import httplib2    # type: ignore
+from google.auth.transport.requests import Request    # type: ignore
+from google.oauth2.credentials import Credentials    # type: ignore
+from googleapiclient.discovery import Resource, build    # type: ignore
+
+
+__all__ = (
+    "ClientPool",
+)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class ClientPool:
+    """
+    Drive clients for worker threads, one HTTP transport per thread.
+
+    httplib2 connections are not thread-safe, so each worker thread gets its
+    own authorised transport with its own copy of the credentials, which it
+    refreshes by itself, also when a request comes back 401. Workers live
+    as long as the pool, so each builds its client once.
+    """
+
+    def __init__(self, creds: Credentials, *, max_workers: int = 8):
+        self.creds = creds
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._clients: list[Resource] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _thread_creds(self) -> Credentials:
+        """
+        Copy of the credentials, with the current token if still valid.
+        """
+        with self._lock:
+            if not self.creds.valid:
+                self.creds.refresh(Request())
+            info = json.loads(self.creds.to_json())
+        return Credentials.from_authorized_user_info(info, self.creds.scopes)
+
+    def client(self) -> Resource:
+        """
+        Return the calling thread's client, building it on first use.
+        """
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            http = google_auth_httplib2.AuthorizedHttp(
+                self._thread_creds(), http=httplib2.Http()
+            )
+            client = build("drive", "v3", http=http, cache_discovery=False)
+            self._local.client = client
+            with self._lock:
+                self._clients.append(client)
+        return client
+
+    def _mark_worker(self):
+        self._local.worker = True
+
+    def map(
+        self,
+        func: Callable[[T], R],
+        items: Iterable[T],
+        *,
+        callback: Optional[Callable[[R], None]] = None
+    ) -> list[R]:
+        """
+        Apply func to every item from the worker threads, results in order.
+
+        ``callback`` is called in the calling thread as each result arrives.
+        Called from a worker, items are run in that worker, as waiting on
+        the other workers could deadlock. Items run in a copy of the
+        caller's context, so context variables, e.g. the profiler's active
+        stages, carry over.
+        """
+        results = []
+        if getattr(self._local, 'worker', False):
+            mapped: Iterable[R] = map(func, items)
+        else:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        initializer=self._mark_worker
+                    )
+                executor = self._executor
+            context = copy_context()
+
+            def run(item: T) -> R:
+                return context.copy().run(func, item)
+
+            mapped = executor.map(run, items)
+        for result in mapped:
+            if callback is not None:
+                callback(result)
+            results.append(result)
+        return results
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients.clear()
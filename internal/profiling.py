@@ -0,0 +1,190 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import cProfile
+from dataclasses import dataclass, field
+from functools import wraps
+import json
+from pathlib import Path
+import pstats
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional
+
+from googleapiclient.http import HttpRequest    # type: ignore
+
+
+__all__ = (
+    "StageTiming",
+    "Profiler",
+)
+
+
+@dataclass
+class StageTiming:
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    api_wait: float = 0.0
+    api_calls: int = 0
+    # NOTE: Waited on by worker threads the stage handed work to, this
+    # overlaps the stage's wall time.
+    worker_api_wait: float = 0.0
+    worker_api_calls: int = 0
+
+    @property
+    def other(self) -> float:
+        """
+        Wall time neither on CPU nor waiting on the API, e.g. subprocesses.
+        """
+        return max(self.wall - self.cpu - self.api_wait, 0.0)
+
+
+@dataclass
+class Profiler:
+    """
+    Opt-in per-stage wall, CPU and API-wait timings.
+
+    The outermost stage on the main thread also runs under cProfile, stats
+    from every call are merged into ``<output>/<stage>.prof``. API wait is
+    measured around ``HttpRequest.execute`` while installed. CPU time and
+    API wait are the calling thread's. API wait in worker threads goes to
+    the stages active where the work was submitted, as worker API wait,
+    if the pool carries the submitter's context along.
+    """
+    output: Path = Path('profile')
+    timings: dict[str, StageTiming] = field(
+        default_factory=lambda: defaultdict(StageTiming)
+    )
+
+    def __post_init__(self):
+        self.output = Path(self.output).expanduser()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # NOTE: Active stages and the threads which entered them.
+        self._active: ContextVar[tuple[tuple[str, int], ...]] = \
+            ContextVar(f'profiler_stages_{id(self)}', default=())
+        self._execute: Optional[Callable] = None
+        self._profiles: list[tuple[str, cProfile.Profile]] = []
+
+    def install(self):
+        """
+        Time every API request until ``uninstall``.
+        """
+        if self._execute is not None:
+            return
+        self._execute = execute = HttpRequest.execute
+        local = self._local
+
+        @wraps(execute)
+        def timed_execute(*args: Any, **kwargs: Any):
+            start = time.perf_counter()
+            try:
+                return execute(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                local.api_wait = getattr(local, 'api_wait', 0.0) + elapsed
+                local.api_calls = getattr(local, 'api_calls', 0) + 1
+                self._add_worker_wait(elapsed)
+
+        HttpRequest.execute = timed_execute
+
+    def uninstall(self):
+        if self._execute is not None:
+            HttpRequest.execute = self._execute
+            self._execute = None
+
+    def _add_worker_wait(self, elapsed: float):
+        """
+        Add API wait to the active stages entered on other threads.
+        """
+        ident = threading.get_ident()
+        names = {name for name, owner in self._active.get() if owner != ident}
+        if not names:
+            return
+        with self._lock:
+            for name in names:
+                timing = self.timings[name]
+                timing.worker_api_wait += elapsed
+                timing.worker_api_calls += 1
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageTiming]:
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        profile = None
+        main = threading.current_thread() is threading.main_thread()
+        if depth == 0 and main:
+            profile = cProfile.Profile()
+        local.depth = depth + 1
+        active = self._active.set(
+            self._active.get() + ((name, threading.get_ident()),)
+        )
+
+        api_wait = getattr(local, 'api_wait', 0.0)
+        api_calls = getattr(local, 'api_calls', 0)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:
+                # NOTE: Python 3.12+ allows one active profiler at a time.
+                profile = None
+        try:
+            yield self.timings[name]
+        finally:
+            if profile is not None:
+                profile.disable()
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            local.depth = depth
+            self._active.reset(active)
+            with self._lock:
+                timing = self.timings[name]
+                timing.calls += 1
+                timing.wall += wall
+                timing.cpu += cpu
+                timing.api_wait += getattr(local, 'api_wait', 0.0) - api_wait
+                timing.api_calls += getattr(local, 'api_calls', 0) - api_calls
+                if profile is not None:
+                    self._profiles.append((name, profile))
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def report(self) -> dict[str, dict[str, float]]:
+        """
+        Return timings per stage and save them to ``<output>/stages.json``.
+        """
+        self.output.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            profiles, self._profiles = self._profiles, []
+        merged: dict[str, pstats.Stats] = {}
+        for name, profile in profiles:
+            if name in merged:
+                merged[name].add(profile)
+            else:
+                merged[name] = pstats.Stats(profile)
+        for name, stats in merged.items():
+            stats.dump_stats(self.output / f"{name}.prof")
+
+        report = {
+            name: {
+                "calls": timing.calls,
+                "wall": timing.wall,
+                "cpu": timing.cpu,
+                "api_wait": timing.api_wait,
+                "api_calls": timing.api_calls,
+                "worker_api_wait": timing.worker_api_wait,
+                "worker_api_calls": timing.worker_api_calls,
+                "other": timing.other,
+            }
+            for name, timing in self.timings.items()
+        }
+        with open(self.output / 'stages.json', 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+        return report
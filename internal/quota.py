@@ -0,0 +1,152 @@
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+import time
+from typing import NamedTuple, Optional
+
+from .datatypes import Unit
+
+
+__all__ = (
+    "DAILY_QUOTA",
+    "WINDOW",
+    "QuotaLedger",
+    "TransferPlan",
+    "schedule_transfer",
+)
+
+# NOTE: Google Drive allows 750 GB of uploads per account per 24h.
+DAILY_QUOTA: int = 750 * Unit.GB
+WINDOW: float = 24 * 60 * 60
+
+
+class TransferPlan(NamedTuple):
+    upper_limit: int
+    sa_begin: int
+    sa_end: int
+
+
+@dataclass
+class QuotaLedger:
+    """
+    Persistent record of bytes uploaded by each service account.
+
+    Entries are ``(timestamp, bytes)`` pairs, kept per service account
+    number, and only those within the rolling 24h window count as used.
+    """
+    path: Path = Path('quota.json')
+    quota: int = DAILY_QUOTA
+    window: float = WINDOW
+    entries: dict[int, list[tuple[float, int]]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str | Path = 'quota.json', **kwargs) -> 'QuotaLedger':
+        path = Path(path).expanduser()
+        entries: dict[int, list[tuple[float, int]]] = {}
+        if path.exists():
+            with open(path, encoding='utf-8') as fh:
+                raw = json.load(fh)
+            entries = {
+                int(sa): [(float(ts), int(nbytes)) for ts, nbytes in records]
+                for sa, records in raw.items()
+            }
+        return cls(path=path, entries=entries, **kwargs)
+
+    def save(self):
+        self.prune()
+        with open(self.path, 'w', encoding='utf-8') as fh:
+            json.dump(
+                {str(sa): records for sa, records in self.entries.items()},
+                fh
+            )
+
+    def prune(self, now: Optional[float] = None):
+        """
+        Drop entries which have fallen out of the rolling window.
+        """
+        cutoff = (time.time() if now is None else now) - self.window
+        for sa in list(self.entries):
+            kept = [rec for rec in self.entries[sa] if rec[0] > cutoff]
+            if kept:
+                self.entries[sa] = kept
+            else:
+                del self.entries[sa]
+
+    def record(self, sa: int, nbytes: int, now: Optional[float] = None):
+        if nbytes <= 0:
+            return
+        ts = time.time() if now is None else now
+        self.entries.setdefault(sa, []).append((ts, nbytes))
+
+    def used(self, sa: int, now: Optional[float] = None) -> int:
+        cutoff = (time.time() if now is None else now) - self.window
+        return sum(
+            nbytes for ts, nbytes in self.entries.get(sa, []) if ts > cutoff
+        )
+
+    def available(self, sa: int, now: Optional[float] = None) -> int:
+        return max(self.quota - self.used(sa, now), 0)
+
+    def accounts_for(
+        self,
+        nbytes: int,
+        sa_begin: int,
+        sa_end: int,
+        now: Optional[float] = None
+    ) -> int:
+        """
+        Number of accounts from ``sa_begin`` whose quota left covers nbytes.
+
+        The whole range if even that falls short.
+        """
+        now = time.time() if now is None else now
+        left = nbytes
+        for count, sa in enumerate(range(sa_begin, sa_end + 1), start=1):
+            left -= self.available(sa, now)
+            if left <= 0:
+                return count
+        return max(sa_end - sa_begin + 1, 0)
+
+
+def schedule_transfer(
+    ledger: QuotaLedger,
+    *,
+    sa_begin: int = 1,
+    sa_end: int = 600,
+    max_cluster_size: int = 600 * Unit.GB,
+    min_headroom: int = 10 * Unit.GB,
+    now: Optional[float] = None
+) -> Optional[TransferPlan]:
+    """
+    Pick cluster size and service account range for the next copy.
+
+    Service accounts with less than ``min_headroom`` left are skipped, and
+    the cluster is capped at the quota left across the chosen range, so the
+    copy finishes before any account hits ``userRateLimitExceeded``.
+    Return ``None`` if every account in the range is exhausted.
+    """
+    if sa_begin > sa_end:
+        raise ValueError(f"Invalid range: {sa_begin=}, {sa_end=}")
+
+    now = time.time() if now is None else now
+    begin = None
+    capacity = 0
+    end = sa_end
+    for sa in range(sa_begin, sa_end + 1):
+        available = ledger.available(sa, now)
+        if available < min_headroom:
+            if begin is None:
+                continue
+            # NOTE: rclone_sa_magic rotates through a contiguous range.
+            end = sa - 1
+            break
+        if begin is None:
+            begin = sa
+        capacity += available
+        if capacity >= max_cluster_size:
+            end = sa
+            break
+
+    if begin is None:
+        return None
+    return TransferPlan(min(capacity, max_cluster_size), begin, end)
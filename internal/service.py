@@ -9,15 +9,28 @@
 # TODO: Add docstring.
 
 
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
 from functools import cache
 import json
 import os
-from pathlib import Path
+import random
+from pathlib import Path, PurePosixPath
 from signal import SIGINT
 import shlex
 import subprocess
+import threading
 import time
-from typing import Generator, Iterable, Literal, Optional, cast, overload
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Generator,
+    Iterable,
+    Literal,
+    Optional,
+    TypeVar,
+    overload
+)
 
 from getfilelistpy import getfilelist   # type: ignore
 from google.auth.transport.requests import Request    # type: ignore
@@ -42,11 +55,28 @@ from .datatypes import (
     FOLDER_MIME_TYPE,
     Item,
     SupportRich,
+    Unit,
     folder_to_id,
     format_size
 )
+from .filters import ItemFilter, escape, rfc3339
+from .logs import StructuredLog
+from .manifest import CLUSTER_DIR, Manifest
+from .merkle import TreeDigest, diff_trees
+from .pool import ClientPool
+from .profiling import Profiler
+from .quota import QuotaLedger
+from .transfer import StreamingTransfer, TransferResult
+from .tree import FolderIndex
+from .tuning import RcloneTuning
+
+if TYPE_CHECKING:
+    from .snapshot import TreeSnapshot
 
 
+T = TypeVar("T")
+R = TypeVar("R")
+
 # NOTE: If modifying these scopes, delete the file token.json.
 SCOPES = [
     'https://www.googleapis.com/auth/drive.metadata.readonly',
@@ -55,24 +85,66 @@ SCOPES = [
 
 
 class DriveService(SupportRich):
-    max_search_pages: int = 50
-    page_size: int = 100
-
-    def __init__(self, *, console: Optional[Console] = None):
+    # NOTE: 1000 is the largest page size files().list allows.
+    page_size: int = 1000
+    # NOTE: Long queries are rejected by Drive, keep well below the limit.
+    max_query_length: int = 2000
+    max_workers: int = 8
+    max_retries: int = 3
+    cluster_dir: Path = CLUSTER_DIR
+    # NOTE: The pinned AutoRclone's rclone_sa_magic.py lacks --files_from
+    # and rclone tuning options, enable once it forwards them to rclone.
+    autorclone_extensions: bool = False
+    # NOTE: Stages worth profiling, not helpers called per item or from
+    # worker threads.
+    profiled_methods: tuple[str, ...] = (
+        "list_dir",
+        "list_tree",
+        "snapshot",
+        "create_folder",
+        "copy",
+        "stream_copy",
+        "delete",
+        "update_permission_recursively",
+        "update_permission",
+        "search_many",
+        "review_copy",
+    )
+
+    def __init__(
+        self,
+        *,
+        console: Optional[Console] = None,
+        verbose: bool = False,
+        log_path: Optional[str | Path] = 'drive.log.jsonl',
+        profiler: Optional[Profiler] = None
+    ):
         if console is None:
             super().__init__()
         else:
             super().__init__(console=console)
+        self.verbose = verbose
+        self.events = StructuredLog(log_path)
         self._creds: Credentials = self.get_creds()
         self._service: Resource = build("drive", "v3", credentials=self.creds)
+        self._pool = ClientPool(self.creds, max_workers=self.max_workers)
+        self.profiler = profiler
+        if profiler is not None:
+            self._profile_methods(profiler)
 
     def __enter__(self) -> 'DriveService':
         self.progress.start()
         return self
 
     def __exit__(self, exc_type, exc_value, exc_tb):
-        self.service.close()
         self.progress.stop()
+        for stage, counts in self.events.summary().items():
+            self.console.log(f"[bold]{stage}[/bold]", counts)
+        self.close()
+        if self.profiler is not None:
+            self.profiler.uninstall()
+            for stage, timing in self.profiler.report().items():
+                self.console.log(f"[bold]{stage}[/bold]", timing)
 
         if isinstance(exc_value, HttpError):
             self.progress.log(
@@ -82,6 +154,22 @@ class DriveService(SupportRich):
             )
             return True
 
+    def close(self):
+        """
+        Close the clients, the worker threads and the event log.
+        """
+        self.service.close()
+        self._pool.close()
+        self.events.close()
+
+    def _profile_methods(self, profiler: Profiler):
+        """
+        Time each of ``profiled_methods`` as its own stage.
+        """
+        profiler.install()
+        for name in self.profiled_methods:
+            setattr(self, name, profiler.wrap(name, getattr(self, name)))
+
     @property
     def creds(self):
         return self._creds
@@ -90,6 +178,60 @@ class DriveService(SupportRich):
     def service(self):
         return self._service
 
+    @property
+    def thread_service(self) -> Resource:
+        """
+        Service local to the calling thread, httplib2 is not thread-safe.
+        """
+        if threading.current_thread() is threading.main_thread():
+            return self._service
+        return self._pool.client()
+
+    def parallel_map(
+        self,
+        func: Callable[[T], R],
+        items: Iterable[T],
+        *,
+        task: Optional[TaskID] = None
+    ) -> list[R]:
+        """
+        Run func over items from the client pool, advancing task if given.
+        """
+        callback = None
+        if task is not None:
+            def callback(_: R):
+                self.progress.advance(task, advance=1)
+        return self._pool.map(func, items, callback=callback)
+
+    def record(
+        self,
+        stage: str,
+        event: str,
+        *objects,
+        error: Optional[BaseException] = None,
+        **fields
+    ):
+        """
+        Write a structured event, echo it to the console when verbose.
+
+        Errors are always echoed, locals are only shown when verbose.
+        """
+        if error is not None:
+            fields['error'] = repr(error)
+        self.events.write(stage, event, **fields)
+        if not objects:
+            return
+        if self.verbose:
+            self.progress.log(*objects, log_locals=error is not None)
+        elif error is not None:
+            self.progress.log(*objects)
+
+    def cluster_metadata(self, folder_id: ItemID) -> Optional[Manifest]:
+        """
+        Manifest attached to a cluster folder, read locally, no API calls.
+        """
+        return Manifest.for_folder(folder_id, self.cluster_dir)
+
     def get_creds(self) -> Credentials:
         """
         Check for valid credentials, and generate token.
@@ -126,6 +268,7 @@ class DriveService(SupportRich):
         self,
         folder_id: str,
         *,
+        where: Optional[ItemFilter] = None,
         log: Optional[bool] = False,
         files_only: Optional[Literal[False]] = False,
         return_count: Optional[Literal[False]] = False,
@@ -138,6 +281,7 @@ class DriveService(SupportRich):
         self,
         folder_id: str,
         *,
+        where: Optional[ItemFilter] = None,
         files_only: Literal[True],
         log: Optional[bool] = False,
         return_count: Optional[Literal[False]] = False,
@@ -150,6 +294,7 @@ class DriveService(SupportRich):
         self,
         folder_id: str,
         *,
+        where: Optional[ItemFilter] = None,
         return_count: Literal[True],
         files_only: Optional[Literal[False]] = False,
         log: Optional[bool] = False,
@@ -162,6 +307,7 @@ class DriveService(SupportRich):
         self,
         folder_id: str,
         *,
+        where: Optional[ItemFilter] = None,
         files_only: Literal[True],
         return_count: Literal[True],
         log: Optional[bool] = False,
@@ -173,6 +319,7 @@ class DriveService(SupportRich):
         self,
         folder_id: str,
         *,
+        where: Optional[ItemFilter] = None,
         files_only: Optional[bool] = False,
         return_count: Optional[bool] = False,
         log: Optional[bool] = False
@@ -183,25 +330,15 @@ class DriveService(SupportRich):
         # TODO: Implement lazy loading.
         """
         Get contents of a folder.
+
+        ``where`` is pushed into the query where possible.
         """
         items: list[Item] = []
 
         if files_only:
-            resource = {
-                "service_account": self.creds,
-                "id": folder_id,
-                "fields": "files(id, name, mimeType, size, parents)",
-            }
-            self.progress.log("Started searching for all files.")
-            dir_listing_task = self.progress.add_task(
-                "[blue]Listing files in dir", total=None)
-            result = getfilelist.GetFileList(resource)
-            self.progress.update(dir_listing_task, total=1, completed=1)
-            self.progress.log(f"{result['totalNumberOfFiles']} files found.")
-            items_f = [File(**item) for batch in result['fileList']
-                       for item in batch['files']]
+            items_f, _ = self.list_tree(folder_id, where=where)
             if return_count:
-                return items_f, cast(int, result['totalNumberOfFiles'])
+                return items_f, len(items_f)
             return items_f
 
         dir_listing_task = None
@@ -211,31 +348,14 @@ class DriveService(SupportRich):
                 "[blue]Listing files in dir", total=None)
 
         try:
-            page_token = None
-            search_pages = 0
-            results = []
-            while search_pages < self.max_search_pages:
-                response = self.service.files().list(
-                    q=f"'{folder_id}' in parents",
-                    spaces='drive',
-                    corpora='allDrives',
-                    includeItemsFromAllDrives=True,
-                    supportsAllDrives=True,
-                    pageToken=page_token,
-                    pageSize=self.page_size,
-                    fields=(
-                        "nextPageToken, "
-                        "files(id, name, mimeType, size, parents)"
-                    ),
-                ).execute()
-                results.extend(response.get('files', []))
-                page_token = response.get('nextPageToken')
-                if page_token is None:
-                    break
-                search_pages += 1
+            query = f"'{folder_id}' in parents"
+            if where is not None:
+                query = where.and_query(query, folders=True)
+            results = self._list_partitioned(query)
         except HttpError as err:
-            self.progress.log("[bold red]ERROR:[/bold red]",
-                              "While listing directory.", err, log_locals=True)
+            self.record("list", "error", "[bold red]ERROR:[/bold red]",
+                        "While listing directory.", err, error=err,
+                        folder=folder_id)
             if log:
                 if dir_listing_task is not None:
                     self.progress.stop_task(dir_listing_task)
@@ -250,17 +370,244 @@ class DriveService(SupportRich):
             self.progress.log(f"{len(results)} items found.")
 
         items_ = [categorize(item) for item in results]
+        if where is not None:
+            items_ = [item for item in items_ if where.matches(item)]
         if return_count:
             return items_, len(items_)
         return items_
 
+    def _list_query(
+        self,
+        query: str,
+        fields: str = "id, name, mimeType, size, parents"
+    ) -> list[FileType | FolderType]:
+        """
+        Fetch every page of a listing query.
+        """
+        page_token = None
+        results = []
+        while True:
+            response = self.thread_service.files().list(
+                q=query,
+                spaces='drive',
+                corpora='allDrives',
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+                pageToken=page_token,
+                pageSize=self.page_size,
+                fields=f"nextPageToken, files({fields})",
+            ).execute()
+            results.extend(response.get('files', []))
+            page_token = response.get('nextPageToken')
+            if page_token is None:
+                return results
+
+    def count_items(self, drive_id: ItemID) -> int:
+        """
+        Count every item in a shared drive, trashed ones included.
+        """
+        count = 0
+        page_token = None
+        while True:
+            response = self.service.files().list(
+                corpora='drive',
+                driveId=drive_id,
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+                pageToken=page_token,
+                pageSize=self.page_size,
+                fields="nextPageToken, files(id)",
+            ).execute()
+            count += len(response.get('files', []))
+            page_token = response.get('nextPageToken')
+            if page_token is None:
+                return count
+
+    def _first_page(
+        self,
+        query: str,
+        fields: str
+    ) -> tuple[list[FileType | FolderType], bool]:
+        """
+        Fetch the oldest page of a query, and whether more pages follow.
+        """
+        response = self.thread_service.files().list(
+            q=query,
+            spaces='drive',
+            corpora='allDrives',
+            includeItemsFromAllDrives=True,
+            supportsAllDrives=True,
+            orderBy='createdTime',
+            pageSize=self.page_size,
+            fields=f"nextPageToken, files({fields})",
+        ).execute()
+        return response.get('files', []), 'nextPageToken' in response
+
+    def _list_partitioned(
+        self,
+        query: str,
+        fields: str = "id, name, mimeType, size, parents"
+    ) -> list[FileType | FolderType]:
+        """
+        Fetch a listing as disjoint createdTime ranges, listed in parallel.
+
+        Each round fetches the oldest page of every range. A range with
+        more pages continues after the last createdTime seen, split into
+        smaller ranges for the next round, so a small folder takes one
+        request and a large flat one keeps ``max_workers`` requests busy.
+        """
+        fields = f"{fields}, createdTime"
+        found: dict[str, FileType | FolderType] = {}
+        ranges: list[TimeRange] = [(None, None)]
+        while ranges:
+            pages = self.parallel_map(
+                lambda bounds: self._first_page(
+                    within(query, *bounds), fields
+                ),
+                ranges
+            )
+            full: list[TimeRange] = []
+            for (low, high), (items, more) in zip(ranges, pages):
+                for item in items:
+                    found.setdefault(item['id'], item)
+                if not more:
+                    continue
+                # NOTE: Times are compared to the second, so items created
+                # in the last second seen are fetched again and dropped.
+                last = created_at(items[-1])
+                if low is not None and last <= low:
+                    # NOTE: A page or more created within one second.
+                    for item in self._list_query(
+                        within(query, low, high), fields
+                    ):
+                        found.setdefault(item['id'], item)
+                    continue
+                full.append((last, high))
+            parts = max(2, self.max_workers // max(len(full), 1))
+            ranges = [
+                part for low, high in full
+                for part in split_range(low, high, parts)
+            ]
+        return list(found.values())
+
+    def list_tree(
+        self,
+        folder_id: str,
+        *,
+        where: Optional[ItemFilter] = None
+    ) -> tuple[list[File], FolderIndex]:
+        """
+        Get all files under a folder, with an index of its sub-folders.
+
+        Without ``where``, one recursive listing. With it, the tree is
+        walked level by level with ``where`` pushed into every query, so
+        excluded folders and everything under them are never listed.
+        """
+        if where is not None:
+            return self._walk(folder_id, where)
+        resource = {
+            "service_account": self.creds,
+            "id": folder_id,
+            "fields": "files(id, name, mimeType, size, parents, md5Checksum)",
+        }
+        self.progress.log("Started searching for all files.")
+        dir_listing_task = self.progress.add_task(
+            "[blue]Listing files in dir", total=None)
+        result = getfilelist.GetFileList(resource)
+        self.progress.update(dir_listing_task, total=1, completed=1)
+        self.progress.log(f"{result['totalNumberOfFiles']} files found.")
+        files = [File(**item) for batch in result['fileList']
+                 for item in batch['files']]
+        return files, FolderIndex.from_filelist(result)
+
+    def _walk(
+        self,
+        folder_id: str,
+        where: ItemFilter,
+        fields: str = "id, name, mimeType, size, parents, md5Checksum"
+    ) -> tuple[list[File], FolderIndex]:
+        """
+        List a tree level by level, with ``where`` in every query.
+
+        Each level's folders and files are listed in parallel. Folders are
+        only filtered by name, and excluded ones are not descended into.
+        """
+        root = self.service.files().get(
+            fileId=folder_id,
+            supportsAllDrives=True,
+            fields="id, name, mimeType, parents"
+        ).execute()
+        index = FolderIndex(folder_id)
+        index.add(Folder(**{**root, "parents": []}))
+        self.progress.log("Started walking folders.")
+        walking_task = self.progress.add_task(
+            "[blue]Walking folders", total=None)
+
+        folder_query = " and ".join(filter(None, (
+            f"mimeType = '{FOLDER_MIME_TYPE}'", where.folder_query()
+        )))
+        file_query = where.and_query(f"mimeType != '{FOLDER_MIME_TYPE}'")
+        files: list[File] = []
+        seen: set[str] = set()
+        pending = [folder_id]
+        while pending:
+            queries = [
+                (parent, f"'{parent}' in parents and {query}")
+                for parent in pending
+                for query in (folder_query, file_query)
+            ]
+            listings = self.parallel_map(
+                lambda pair: self._list_partitioned(pair[1], fields),
+                queries
+            )
+            pending = []
+            for (parent, _), items in zip(queries, listings):
+                for item in items:
+                    if item['mimeType'] != FOLDER_MIME_TYPE:
+                        file = File(**item)
+                        # NOTE: Files in several listed folders come twice.
+                        if file.id not in seen and where.matches(file):
+                            seen.add(file.id)
+                            files.append(file)
+                        continue
+                    folder = Folder(**item)
+                    if where.excludes_name(folder.name) or folder.id in index:
+                        continue
+                    index.add(folder, parent)
+                    pending.append(folder.id)
+            self.progress.update(walking_task, advance=len(pending))
+        self.progress.update(walking_task, total=len(index),
+                             completed=len(index))
+        self.progress.log(f"{len(files)} files found.")
+        return files, index
+
+    def snapshot(
+        self,
+        folder_id: str,
+        *,
+        where: Optional[ItemFilter] = None,
+        path: Optional[str | Path] = None
+    ) -> 'TreeSnapshot':
+        """
+        List a folder recursively into a columnar snapshot, save if path.
+        """
+        from .snapshot import TreeSnapshot
+
+        files, index = self.list_tree(folder_id, where=where)
+        snapshot = TreeSnapshot.from_listing(files, index)
+        if path is not None:
+            snapshot.save(path)
+        return snapshot
+
     def make_cluster(
         self,
         items: Iterable[Item],
         *,
         upper_limit: int,
         max_clusters: int = 1,
-        exclude: set[str] = set()
+        exclude: set[str] = set(),
+        snapshot: Optional['TreeSnapshot'] = None,
+        where: Optional[ItemFilter] = None
     ) -> Generator[Cluster[Item], None, None]:
         # TODO: Make a Cluster class to store cluster related info.
         if not isinstance(max_clusters, int) or max_clusters < 1:
@@ -281,7 +628,16 @@ class DriveService(SupportRich):
         for item in items:
             if item.name in exclude:
                 continue
-            item_size = size_on_disk(item)
+            if where is not None and where.excludes_name(item.name):
+                continue
+            # NOTE: File criteria reach folders through the snapshot, which
+            # only holds files kept by the same filter.
+            if snapshot is not None:
+                item_size = snapshot.size_of(item.id)
+            else:
+                item_size = size_on_disk(item)
+            if where is not None and not where.matches(item, item_size):
+                continue
             if size + item_size > upper_limit:
                 self.progress.update(
                     clustering_task,
@@ -321,27 +677,29 @@ class DriveService(SupportRich):
                 total=total
             )
 
-            for each in item:
-                self.move(each, destination=destination)
-                self.progress.advance(moving_task, advance=1)
+            self.parallel_map(
+                lambda each: self.move(each, destination=destination),
+                list(item),
+                task=moving_task
+            )
             self.progress.log(f"Total top-level folders moved: {total}")
 
         else:
-            self.progress.log(f"Moving {item.name} to {destination}")
+            self.record("move", "start", f"Moving {item.name} to {destination}",
+                        id=item.id, destination=destination)
             previous_parents = ", ".join(item.parents)
             try:
-                _ = self.service.files().update(
+                _ = self.thread_service.files().update(
                     fileId=item.id,
                     addParents=destination,
                     removeParents=previous_parents,
                     fields='id, parents'
                 ).execute()
-            except HttpError as err:
-                self.progress.log("ERROR: occurred while moving.", err,
-                                  log_locals=True)
-            except TimeoutError as err:
-                self.progress.log("ERROR: occurred while moving.", err,
-                                  log_locals=True)
+            except (HttpError, TimeoutError) as err:
+                self.record("move", "error", "ERROR: occurred while moving.",
+                            err, error=err, id=item.id)
+            else:
+                self.record("move", "done", id=item.id)
 
     @folder_to_id
     def copy(
@@ -352,107 +710,209 @@ class DriveService(SupportRich):
         dest_path: str,
         port: str = "5572",
         size_hint: int = None,
-        timeout: int = 900
-    ):
+        timeout: int = 900,
+        sa_begin: int = 1,
+        sa_end: int = 600,
+        ledger: Optional[QuotaLedger] = None,
+        manifest: Optional[Manifest] = None,
+        tuning: Optional[RcloneTuning] = None
+    ) -> int:
+        """
+        Copy source to destination with AutoRclone, return bytes copied.
+
+        A ``manifest``'s total is used as ``size_hint``, it defaults to the
+        manifest attached to source, if any. With ``tuning``, only as many
+        service accounts as it needs are used. With
+        ``autorclone_extensions``, rclone also gets the manifest as its
+        exact file list and its concurrency and chunk size from ``tuning``.
+        """
         assert str(port).isnumeric(), "port must be an integer in string form."
+        if manifest is None:
+            manifest = self.cluster_metadata(source)
+        if manifest is not None and size_hint is None:
+            size_hint = manifest.total_size
+        if tuning is not None and tuning.sa_count is not None:
+            sa_end = min(sa_end, sa_begin + tuning.sa_count - 1)
         copy_task = self.progress.add_task(
             "Copying",
             total=size_hint,
             show_speed=True
         )
-        # source_size = total_size(source)
-        # self.progress.log(f"Total size of items present in source:
-        # {source_size}")
         command = [
             "python3", "rclone_sa_magic.py",
             "-s", str(source),
             "-d", str(destination),
             "-dp", str(dest_path),
-            "-b", "1",
-            "-e", "600",
+            "-b", str(sa_begin),
+            "-e", str(sa_end),
             "-p", port,
-            "--disable_list_r"
         ]
         cwd = Path('~/github/BGFA_rclone/AutoRclone/').expanduser()
+        if manifest is not None and self.autorclone_extensions:
+            files_from = manifest.write_files_from(
+                cwd.parent / 'internal' / f'{manifest.name}.files'
+            )
+            command.extend(["--files_from", str(files_from)])
+        else:
+            command.append("--disable_list_r")
+        if tuning is not None and self.autorclone_extensions:
+            command.extend(tuning.args())
         rc_cmd = shlex.split(f'rclone rc --rc-addr="localhost:{port}" core/stats')
         start = time.perf_counter()
         size_bytes_done = 0
-        printed_once = False
         prev_done = 0
         no_download = 0
-        with open(cwd.parent / 'internal' / 'autorclone.log', 'w+', encoding='utf-8', buffering=1) as fh:
-            with subprocess.Popen(
-                command,
-                cwd=cwd,
-                stdout=fh,
-                stderr=subprocess.STDOUT,
-                encoding='utf-8'
-            ) as proc:
-                time.sleep(10)
-                while proc.poll() is None:
-                    try:
-                        # breakpoint()
-                        result = subprocess.run(
-                            rc_cmd,
-                            capture_output=True,
-                            check=True,
-                            encoding='utf-8',
-                            cwd=cwd
-                        )
-                    except subprocess.CalledProcessError as error:
-                        self.progress.log(
-                            "[red]ERROR:[/red] while checking rclone stats",
-                            error, log_locals=True
-                        )
-                        if time.perf_counter() - start > timeout:
-                            self.progress.update(copy_task, total=1, completed=1)
-                            os.kill(proc.pid, SIGINT)
-                            self.progress.log(f"[red]Timed Out[/red]: {timeout=}")
-                            break
-                        continue
-                    except FileNotFoundError:
-                        if time.perf_counter() - start > timeout:
-                            self.progress.update(copy_task, total=1, completed=1)
+        # NOTE: rclone_sa_magic restarts rclone with the next service
+        # account on rotation, which resets the stats counter.
+        current_sa = sa_begin
+        sa_done = 0
+        copied_total = 0
+        # NOTE: Saved every GB, and on errors or interrupts too.
+        try:
+            with open(cwd.parent / 'internal' / 'autorclone.log', 'w+', encoding='utf-8', buffering=1) as fh:
+                with subprocess.Popen(
+                    command,
+                    cwd=cwd,
+                    stdout=fh,
+                    stderr=subprocess.STDOUT,
+                    encoding='utf-8'
+                ) as proc:
+                    time.sleep(10)
+                    while proc.poll() is None:
+                        try:
+                            # breakpoint()
+                            result = subprocess.run(
+                                rc_cmd,
+                                capture_output=True,
+                                check=True,
+                                encoding='utf-8',
+                                cwd=cwd
+                            )
+                        except subprocess.CalledProcessError as error:
+                            self.record(
+                                "copy", "stats_error",
+                                "[red]ERROR:[/red] while checking rclone stats",
+                                error, error=error
+                            )
+                            if time.perf_counter() - start > timeout:
+                                self.progress.update(copy_task, total=1, completed=1)
+                                os.kill(proc.pid, SIGINT)
+                                self.progress.log(f"[red]Timed Out[/red]: {timeout=}")
+                                break
+                            continue
+                        except FileNotFoundError:
+                            if time.perf_counter() - start > timeout:
+                                self.progress.update(copy_task, total=1, completed=1)
+                                os.kill(proc.pid, SIGINT)
+                                self.progress.log(f"[red]Timed Out[/red]: {timeout=}")
+                                break
+                            continue
+                        response_processed = result.stdout.replace('\0', '')
+                        response_processed_json = json.loads(response_processed)
+                        size_bytes_done = int(response_processed_json['bytes'])
+                        if size_bytes_done < prev_done:
+                            if ledger is not None:
+                                ledger.record(current_sa, prev_done - sa_done)
+                            copied_total += prev_done
+                            current_sa += 1
+                            sa_done = prev_done = 0
+                        if ledger is not None and size_bytes_done - sa_done >= Unit.GB:
+                            ledger.record(current_sa, size_bytes_done - sa_done)
+                            ledger.save()
+                            sa_done = size_bytes_done
+                        if prev_done == size_bytes_done:
+                            no_download += 1
+                        else:
+                            no_download = 0
+                        if no_download >= 300:
+                            self.progress.log(
+                                f"No download for {no_download} times.",
+                            )
                             os.kill(proc.pid, SIGINT)
-                            self.progress.log(f"[red]Timed Out[/red]: {timeout=}")
                             break
-                        continue
-                    response_processed = result.stdout.replace('\0', '')
-                    response_processed_json = json.loads(response_processed)
-                    size_bytes_done = int(response_processed_json['bytes'])
-                    if prev_done == size_bytes_done:
-                        no_download += 1
-                    else:
-                        no_download = 0
-                    if no_download >= 300:
-                        self.progress.log(
-                            f"No download for {no_download} times.",
+                        self.progress.update(
+                            copy_task,
+                            completed=copied_total + size_bytes_done,
                         )
-                        os.kill(proc.pid, SIGINT)
-                        break
-                    if not printed_once:
-                        print(size_bytes_done)
-                        printed_once = True
-                    self.progress.update(
-                        copy_task,
-                        completed=size_bytes_done,
-                    )
-                    prev_done = size_bytes_done
+                        prev_done = size_bytes_done
+        finally:
+            if ledger is not None:
+                ledger.record(current_sa, size_bytes_done - sa_done)
+                ledger.save()
+        size_bytes_done += copied_total
         self.progress.log(
             "[bold green]COPY:[/bold green] copied -> "
             f"{format_size(size_bytes_done)}"
         )
         self.progress.update(copy_task, total=size_bytes_done,
                              completed=size_bytes_done)
+        return size_bytes_done
+
+    @folder_to_id
+    def stream_copy(
+        self,
+        source: ItemID,
+        *,
+        destination: ItemID,
+        dest_creds: Credentials,
+        chunk_size: int = 32 * 1024 ** 2,
+        max_files: int = 4
+    ) -> list[TransferResult]:
+        """
+        Copy source into destination through this machine, chunk by chunk.
+
+        For accounts which can't do server-side copies. Folders are
+        recreated with ``dest_creds``, then file content is streamed with
+        ``max_files`` files in flight and two ``chunk_size`` buffers each.
+        """
+        files, index = self.list_tree(source)
+        engine = StreamingTransfer(
+            self.creds, dest_creds, chunk_size=chunk_size, max_files=max_files
+        )
+        folders: dict[ItemID, ItemID] = {}
+        for folder_id in sorted(
+            index.paths, key=lambda id_: len(index.path(id_).parts)
+        ):
+            folder = index.folder(folder_id)
+            parent = destination if folder_id == index.root \
+                else folders[folder.parents[0]]
+            folders[folder_id] = engine.make_folder(folder.name, parent)
+
+        stream_task = self.progress.add_task(
+            "Streaming",
+            total=sum(file.size for file in files),
+            show_speed=True
+        )
+
+        def advance(result: TransferResult):
+            self.record("stream", "done", id=result.source, size=result.size,
+                        seconds=result.seconds)
+            self.progress.advance(stream_task, advance=result.size)
+
+        try:
+            results = engine.copy(
+                ((file, folders[index.parent(file)]) for file in files),
+                callback=advance
+            )
+        finally:
+            engine.close()
+        copied = sum(result.size for result in results)
+        self.progress.log(
+            "[bold green]STREAM:[/bold green] copied -> "
+            f"{format_size(copied)}"
+        )
+        return results
 
     def delete(self, item: ItemID):
         try:
             self.service.files().delete(fileId=item).execute()
         except HttpError as err:
-            self.progress.log(
+            self.record(
+                "delete", "error",
                 "[bold red]ERROR:[/bold red] occurred while deleting.",
                 err,
-                log_locals=True
+                error=err,
+                id=item
             )
 
     @folder_to_id
@@ -484,9 +944,12 @@ class DriveService(SupportRich):
     def search(
         self,
         query: str,
+        *,
+        where: Optional[ItemFilter] = None,
         **kwargs: ItemID
     ) -> Generator[Item, None, None]:
-        query = query
+        if where is not None:
+            query = where.and_query(query)
         try:
             page_token = None
             while True:
@@ -503,18 +966,96 @@ class DriveService(SupportRich):
                     pageToken=page_token,
                     **kwargs
                 ).execute()
-                yield from (
-                    categorize(item) for item in response.get('files', [])
-                )
+                for item in response.get('files', []):
+                    match = categorize(item)
+                    if where is None or where.matches(match):
+                        yield match
                 page_token = response.get('nextPageToken', None)
                 if page_token is None:
                     break
 
         except HttpError as err:
-            self.progress.log("[bold red]ERROR:[/bold red]",
-                              err, log_locals=True)
+            self.record("search", "error", "[bold red]ERROR:[/bold red]",
+                        err, error=err, query=query)
             return None
 
+    def _search_all(self, query: str, **kwargs: ItemID) -> list[Item]:
+        results: list[Item] = []
+        page_token = None
+        while True:
+            response = self.thread_service.files().list(
+                q=query,
+                spaces='drive',
+                corpora='drive',
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+                pageSize=1000,
+                fields=(
+                    'nextPageToken, '
+                    'files(id, name, mimeType, size, parents)'
+                ),
+                pageToken=page_token,
+                **kwargs
+            ).execute()
+            results.extend(
+                categorize(item) for item in response.get('files', [])
+            )
+            page_token = response.get('nextPageToken', None)
+            if page_token is None:
+                return results
+
+    def search_many(
+        self,
+        names: Iterable[str],
+        **kwargs: ItemID
+    ) -> dict[str, list[Item]]:
+        """
+        Search many names at once, return matches grouped by name.
+
+        Names are packed into ``name='a' or name='b' ...`` queries up to
+        ``max_query_length``, which are run concurrently. A failing query
+        is retried ``max_retries`` times, then its error is raised.
+        """
+        wanted = set(names)
+        queries: list[str] = []
+        clauses: list[str] = []
+        length = 0
+        for name in sorted(wanted):
+            clause = f"name='{escape(name)}'"
+            if clauses and length + len(clause) + 4 > self.max_query_length:
+                queries.append(" or ".join(clauses))
+                clauses, length = [], 0
+            clauses.append(clause)
+            length += len(clause) + 4
+        if clauses:
+            queries.append(" or ".join(clauses))
+
+        matches: dict[str, list[Item]] = {name: [] for name in wanted}
+        search_task = self.progress.add_task(
+            "[yellow]Searching", total=len(queries))
+
+        def run(query: str) -> list[Item]:
+            # NOTE: An empty result would report every name as missing,
+            # so retry and raise rather than return nothing.
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return self._search_all(query, **kwargs)
+                except HttpError as err:
+                    self.record("search", "error",
+                                "[bold red]ERROR:[/bold red]",
+                                "While searching.", err, error=err,
+                                attempt=attempt)
+                    if attempt == self.max_retries:
+                        raise
+                    time.sleep(2 ** attempt)
+            raise AssertionError("unreachable")
+
+        for found in self.parallel_map(run, queries, task=search_task):
+            for item in found:
+                if item.name in matches:
+                    matches[item.name].append(item)
+        return matches
+
     def search_by_id(self, id: str) -> Item:
         # TODO: merge with search
         item = self.service.files().get(
@@ -528,73 +1069,121 @@ class DriveService(SupportRich):
     def _get_files_from_parent(
         self,
         source: ItemID,
-    ) -> list[tuple[File, Folder]]:
-        # TODO: merge with list_dir
-        items = []
-        files, total = self.list_dir(
-            source, files_only=True, return_count=True
-        )
-
-        listing_task = self.progress.add_task(
-            "[yellow]Gathering parents",
-            total=total
-        )
-        hack = False
-        for item in files:
-            self.progress.advance(listing_task, advance=1)
-            # HACK: DON'T NEED PARENT IF WE ARE NOT CHECKING IN REVIEW
-            if not hack:
-                parent = self.search_by_id(item.parents[0])
-                assert isinstance(parent, Folder), "Parent must be a Folder"
-                hack = True
-            items.append((item, parent))
-        return items
+    ) -> list[tuple[File, PurePosixPath]]:
+        """
+        Return all files under source, with their parent's relative path.
+        """
+        files, index = self.list_tree(source)
+        return [(item, index.path(index.parent(item))) for item in files]
 
     @folder_to_id
-    def update_permission_recursively(self, folder_id: ItemID, total: int=None):
+    def update_permission_recursively(
+        self,
+        folder_id: ItemID,
+        total: int = None,
+        *,
+        sample: int = 20
+    ) -> list[str]:
+        """
+        Grant anyone/writer on a folder and every item under it.
+
+        Existing and inherited permissions are read while listing, and
+        only items still lacking access are granted. A random ``sample`` of
+        the rest is then checked, if any lacks access, all of the rest are
+        granted. Return ids granted explicitly. ``total`` defaults to the item
+        count of the cluster manifest attached to the folder.
+        """
+        if total is None:
+            metadata = self.cluster_metadata(folder_id)
+            if metadata is not None:
+                total = metadata.nitems
         recursive_task = self.progress.add_task(
-            "[magenta]Granting permissions recursively", total=total)
-        self._permission_helper(folder_id)
-        self._recursive_permission_helper(folder_id, progress=recursive_task)
-        self.progress.update(recursive_task, total=total,
-                             completed=total, visible=False)
-
-    def _recursive_permission_helper(self, folder_id: str, progress: TaskID = None):
-        items = self.service.files().list(
-            q=f"'{folder_id}' in parents",
-            spaces='drive',
-            fields='nextPageToken, files(id, name, mimeType, size, parents)',
-        ).execute().get('files', [])
-        for item in items:
-            self.update_permission(item['id'], recurse=True)
-            if item['mimeType'] == FOLDER_MIME_TYPE:
-                self._recursive_permission_helper(item['id'])
-            if progress is not None:
-                self.progress.advance(progress, advance=1)
+            "[magenta]Planning permissions", total=total)
+        root = self.service.files().get(
+            fileId=folder_id,
+            supportsAllDrives=True,
+            fields=PERMISSION_FIELDS
+        ).execute()
+        granted = []
+        if not has_anyone_writer(root):
+            self._permission_helper(folder_id)
+            granted.append(folder_id)
+
+        missing: list[str] = []
+        seen: list[str] = []
+        pending = [folder_id]
+        while pending:
+            listings = self.parallel_map(
+                lambda parent: self._list_query(
+                    f"'{parent}' in parents", fields=PERMISSION_FIELDS
+                ),
+                pending
+            )
+            pending = []
+            for item in (item for items in listings for item in items):
+                seen.append(item['id'])
+                if not has_anyone_writer(item):
+                    missing.append(item['id'])
+                if item['mimeType'] == FOLDER_MIME_TYPE:
+                    pending.append(item['id'])
+        self.progress.update(recursive_task, total=len(seen), completed=0,
+                             description="[magenta]Granting permissions")
+        self.parallel_map(self._permission_helper, missing,
+                          task=recursive_task)
+        granted.extend(missing)
+
+        unverified = sorted(set(seen) - set(missing))
+        checked = random.sample(unverified, min(sample, len(unverified)))
+        lacking = [
+            file_id for file_id, item in zip(checked, self.parallel_map(
+                lambda file_id: self.thread_service.files().get(
+                    fileId=file_id,
+                    supportsAllDrives=True,
+                    fields=PERMISSION_FIELDS
+                ).execute(),
+                checked
+            ))
+            if not has_anyone_writer(item)
+        ]
+        if lacking:
+            # NOTE: Inheritance didn't reach every item, so none of the
+            # unsampled ones can be trusted either.
+            self.record(
+                "permission", "verify_failed",
+                f"[yellow]{len(lacking)}/{len(checked)} sampled items "
+                f"lacked access, granting all {len(unverified)}.",
+                count=len(lacking)
+            )
+            self.parallel_map(self._permission_helper, unverified)
+            granted.extend(unverified)
+        self.progress.log(
+            f"Permissions: {len(granted)} granted, "
+            f"{len(seen) + 1 - len(granted)} already had access."
+        )
+        self.progress.update(recursive_task, total=len(seen),
+                             completed=len(seen), visible=False)
+        return granted
 
     def update_permission(
         self,
         *items: Item | str,
         recurse: bool = False
-    ) -> dict[str, list[str]]:
-        permissions = dict()
+    ) -> dict[str, Optional[dict]]:
         permission_task = None
 
         if not recurse:
             permission_task = self.progress.add_task(
                 "[magenta]Granting permissions", total=len(items))
 
-        for item in items:
-            if not isinstance(item, str):
-                item_id = item.id
-            else:
-                item_id = item
-            permissions[item_id] = self._permission_helper(item_id)
-            if not recurse and permission_task is not None:
-                self.progress.advance(permission_task, advance=1)
-        return permissions
+        item_ids = [
+            item if isinstance(item, str) else item.id for item in items
+        ]
+        results = self.parallel_map(
+            self._permission_helper, item_ids, task=permission_task
+        )
+        return dict(zip(item_ids, results))
 
-    def _permission_helper(self, file_id: str):
+    def _permission_helper(self, file_id: str) -> Optional[dict]:
         error_count = 0
         while error_count <= 5:
             try:
@@ -602,70 +1191,118 @@ class DriveService(SupportRich):
                               'value': 'anyone',
                               # 'role': 'writer'}
                               'role': 'writer'}
-                changed_permission = self.service.permissions().create(
+                changed_permission = self.thread_service.permissions().create(
                     fileId=file_id,
                     body=permission
                 ).execute()
-                self.progress.log("changed_permission = ", changed_permission)
-                break
+                self.record("permission", "done", "changed_permission = ",
+                            changed_permission, id=file_id)
+                return changed_permission
             except HttpError as error:
-                self.progress.log(
+                self.record(
+                    "permission", "error",
                     '[bold red]ERROR[/bold red]',
                     "While granting permission",
                     error,
-                    log_locals=True
+                    error=error,
+                    id=file_id
                 )
                 if error.reason == 'Internal Error':
                     error_count += 1
-                    self.progress.log(f"Retrying {error_count} ...")
+                    self.record("permission", "retry",
+                                f"Retrying {error_count} ...", id=file_id)
                 else:
                     break
+        return None
 
     @folder_to_id
     def review_copy(
         self,
         source: ItemID,
-        destination: ItemID
+        destination: ItemID,
+        dest_folder: Optional[ItemID] = None,
+        merkle: bool = False
     ) -> CopyStats:
+        """
+        Check which files under source are present in destination.
+
+        If ``dest_folder``, the copy of source inside destination, is given,
+        files must also match their relative path, else name and size. With
+        ``merkle``, subtrees are compared by digest and only differing ones
+        are checked file by file. The manifest attached to source, if any,
+        gives the expected file count up front.
+        """
         # TODO: Use TypedDict / SimpleNamespaces / NamedTuple for result
         copied = []
         not_copied = []
-        total_files = 0
-        nmatches = 0
+        metadata = self.cluster_metadata(source)
+        review_task = self.progress.add_task(
+            "[green]Reviewing",
+            total=None if metadata is None else len(metadata)
+        )
+
+        if merkle:
+            assert dest_folder is not None, "merkle review needs dest_folder."
+            source_tree = TreeDigest(*self.list_tree(source))
+            dest_tree = TreeDigest(*self.list_tree(dest_folder))
+            not_copied = diff_trees(source_tree, dest_tree)
+            missing = {file.id for file in not_copied}
+            copied = [
+                file for files in source_tree.files.values()
+                for file in files if file.id not in missing
+            ]
+            nfiles = len(copied) + len(not_copied)
+            self._check_metadata(metadata, nfiles)
+            self.progress.update(review_task, total=nfiles, completed=nfiles)
+            return self._review_stats(copied, not_copied)
 
         files_from_parent = self._get_files_from_parent(source)
         self.progress.log(
             "All files and their parents found. Starting review.")
 
-        review_task = self.progress.add_task(
-            "[green]Reviewing", total=len(files_from_parent))
-        for file, parent in files_from_parent:
-            total_files += 1
-            fname = file.name.replace("'", "\\'")
-            query = f"""name='{fname}'"""  # and '{destination}' in parents"""
-            search_results = self.search(query, driveId=destination)
-            for match in search_results:
+        if dest_folder is not None:
+            # NOTE: Path-aware, one listing of the destination subtree.
+            dest_files = self._get_files_from_parent(dest_folder)
+            search_results: dict[tuple, list[Item]] = {}
+            for match, path in dest_files:
+                search_results.setdefault((path, match.name), []).append(match)
+        else:
+            by_name = self.search_many(
+                (file.name for file, _ in files_from_parent),
+                driveId=destination
+            )
+            search_results = {
+                (path, file.name): by_name[file.name]
+                for file, path in files_from_parent
+            }
+        self._check_metadata(metadata, len(files_from_parent))
+        self.progress.update(review_task, total=len(files_from_parent))
+        for file, path in files_from_parent:
+            for match in search_results.get((path, file.name), []):
                 if isinstance(match, Folder):
                     continue
-                # parent_ids = match.parents
-                # if len(parent_ids) > 1:
-                #     breakpoint()
-                # parents_in_dest = [
-                #     self.search_by_id(parent_id) for parent_id in parent_ids
-                # ]
-                # matching_parents = any(
-                #     p_dest.name == parent.name
-                #     for p_dest in parents_in_dest
-                # )
-                if (file.size == match.size):   # and matching_parents:
-                    nmatches += 1
+                if file.size == match.size:
                     copied.append(file)
                     break
             else:
                 not_copied.append(file)
             self.progress.advance(review_task, advance=1)
 
-        all_copied = True if nmatches == total_files else False
+        return self._review_stats(copied, not_copied)
+
+    def _check_metadata(self, metadata: Optional[Manifest], nfiles: int):
+        if metadata is not None and len(metadata) != nfiles:
+            self.progress.log(
+                f"[yellow]WARNING:[/yellow] {metadata.name} should have "
+                f"{len(metadata)} files, {nfiles} found in source."
+            )
+
+    def _review_stats(
+        self,
+        copied: list[File],
+        not_copied: list[File]
+    ) -> CopyStats:
+        all_copied = not not_copied
         if copied:
             with open("copied.log", 'w+') as fh:
                 for item in copied:
@@ -685,6 +1322,73 @@ class DriveService(SupportRich):
         return CopyStats(all_copied, copied, not_copied, fmt)
 
 
+PERMISSION_FIELDS = "id, mimeType, permissions(type, role)"
+WRITER_ROLES = {"writer", "fileOrganizer", "organizer", "owner"}
+
+
+def has_anyone_writer(item: dict) -> bool:
+    """
+    Check for an anyone permission with write access, own or inherited.
+
+    Items in shared drives list no permissions, and always count as lacking.
+    """
+    return any(
+        permission.get('type') == 'anyone'
+        and permission.get('role') in WRITER_ROLES
+        for permission in item.get('permissions', [])
+    )
+
+
+TimeRange = tuple[Optional[datetime], Optional[datetime]]
+
+
+def created_at(item: FileType | FolderType) -> datetime:
+    """
+    Creation time of a listed item, truncated to the second.
+    """
+    created = datetime.fromisoformat(item['createdTime'])   # type: ignore
+    return created.replace(microsecond=0)
+
+
+def within(
+    query: str,
+    low: Optional[datetime],
+    high: Optional[datetime]
+) -> str:
+    """
+    Restrict query to items created in ``[low, high)``, open if ``None``.
+    """
+    clauses = [f"({query})"]
+    if low is not None:
+        clauses.append(f"createdTime >= '{rfc3339(low)}'")
+    if high is not None:
+        clauses.append(f"createdTime < '{rfc3339(high)}'")
+    return " and ".join(clauses) if len(clauses) > 1 else query
+
+
+def split_range(
+    low: datetime,
+    high: Optional[datetime],
+    parts: int
+) -> list[TimeRange]:
+    """
+    Split ``[low, high)`` into up to ``parts`` ranges of whole seconds.
+
+    An open ``high`` is split up to a day from now, the last range stays
+    open.
+    """
+    end = high or datetime.now(timezone.utc) + timedelta(days=1)
+    step = max((end - low) / parts, timedelta(seconds=1))
+    bounds = [low]
+    while bounds[-1] + step < end and len(bounds) < parts:
+        bounds.append((bounds[-1] + step).replace(microsecond=0))
+    return [
+        (start, stop)
+        for start, stop in zip(bounds, [*bounds[1:], high])
+        if stop is None or start < stop
+    ]
+
+
 def categorize(item: FileType | FolderType) -> Item:
     try:
         return File(**item) if 'size' in item else Folder(**item)
@@ -701,11 +1405,7 @@ def total_size(item: Item) -> int:
     # TODO: Use size-related functions
     if isinstance(item, File):
         return item.size
-    total = 0
-    gdrive = DriveService()
-    for item in gdrive.list_dir(item.id):
-        total += total_size(item)
-    return total
+    return sum(per_item_size(item, per_item=True))
 
 
 def per_item_size(
@@ -715,9 +1415,21 @@ def per_item_size(
 ) -> Generator[int, None, None]:
     if isinstance(item, File):
         yield item.size
-    gdrive = DriveService()
-    for item in gdrive.list_dir(item.id):
-        yield from per_item_size(item, per_item=per_item)
+        return
+    # NOTE: One service for the whole walk, closed when it ends.
+    with closing(DriveService()) as gdrive:
+        yield from _walk_sizes(gdrive, item)
+
+
+def _walk_sizes(
+        gdrive: DriveService,
+        folder: Folder
+) -> Generator[int, None, None]:
+    for item in gdrive.list_dir(folder.id):
+        if isinstance(item, File):
+            yield item.size
+        else:
+            yield from _walk_sizes(gdrive, item)
 
 
 @overload
@@ -0,0 +1,158 @@
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+import sqlite3
+from typing import Iterable, Iterator, Optional
+
+from .datatypes import ItemID
+
+
+__all__ = (
+    "SHARED_DRIVE_LIMIT",
+    "DestinationShards",
+)
+
+# NOTE: Shared drives hold at most 400,000 files and folders, trashed
+# items included.
+SHARED_DRIVE_LIMIT: int = 400_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS destinations (
+    drive TEXT PRIMARY KEY,
+    items INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    cluster TEXT PRIMARY KEY,
+    drive TEXT NOT NULL,
+    items INTEGER NOT NULL
+);
+"""
+
+
+@dataclass
+class DestinationShards:
+    """
+    Spread clusters over several destination shared drives.
+
+    Keeps item counts per drive and which drive each cluster went to in
+    SQLite, next to the cluster queue, so hosts share one index. A cluster
+    always goes whole to one drive, picked from ``destinations`` only.
+    Counts start from ``set_count``, drives never counted are in
+    ``uncounted`` and taken as empty.
+    """
+    destinations: Iterable[ItemID]
+    path: Path = Path('clusters.sqlite')
+    limit: int = SHARED_DRIVE_LIMIT
+    # NOTE: Leave room for items added outside of these copies.
+    headroom: float = 0.95
+
+    def __post_init__(self):
+        self.path = Path(self.path).expanduser()
+        self.destinations = tuple(self.destinations)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # NOTE: Autocommit, assign begins its own transaction.
+        with closing(sqlite3.connect(
+            self.path, timeout=30, isolation_level=None
+        )) as db:
+            yield db
+
+    def counts(self) -> dict[ItemID, int]:
+        """
+        Item counts of the configured destinations.
+        """
+        with self._connect() as db:
+            rows = dict(db.execute("SELECT drive, items FROM destinations"))
+        return {drive: rows.get(drive, 0) for drive in self.destinations}
+
+    def uncounted(self) -> list[ItemID]:
+        """
+        Configured destinations without a count yet.
+        """
+        with self._connect() as db:
+            counted = {row[0] for row in db.execute(
+                "SELECT drive FROM destinations"
+            )}
+        return [drive for drive in self.destinations if drive not in counted]
+
+    def room(self, drive: ItemID) -> int:
+        return self._room(self.counts()[drive])
+
+    def _room(self, items: int) -> int:
+        return int(self.limit * self.headroom) - items
+
+    def assign(self, cluster: str, nitems: int) -> Optional[ItemID]:
+        """
+        Return the drive for a cluster, picking the emptiest that fits.
+
+        ``cluster`` is the cluster folder's id, names repeat across runs. A
+        cluster already assigned keeps its drive. Return ``None`` if no
+        destination has room.
+        """
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                drive = self._assign(db, cluster, nitems)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        return drive
+
+    def _assign(
+        self,
+        db: sqlite3.Connection,
+        cluster: str,
+        nitems: int
+    ) -> Optional[ItemID]:
+        row = db.execute(
+            "SELECT drive FROM assignments WHERE cluster = ?", (cluster,)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        counts = dict(db.execute("SELECT drive, items FROM destinations"))
+        fits = [
+            drive for drive in self.destinations
+            if self._room(counts.get(drive, 0)) >= nitems
+        ]
+        if not fits:
+            return None
+        drive = max(fits, key=lambda drive: self._room(counts.get(drive, 0)))
+        db.execute(
+            "INSERT INTO destinations (drive, items) VALUES (?, ?) "
+            "ON CONFLICT (drive) DO UPDATE SET items = items + excluded.items",
+            (drive, nitems),
+        )
+        db.execute(
+            "INSERT INTO assignments (cluster, drive, items) VALUES (?, ?, ?)",
+            (cluster, drive, nitems),
+        )
+        return drive
+
+    def destination(
+        self,
+        cluster: str,
+        default: Optional[ItemID] = None
+    ) -> Optional[ItemID]:
+        """
+        Drive a cluster was assigned to, ``default`` if it never was.
+        """
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT drive FROM assignments WHERE cluster = ?", (cluster,)
+            ).fetchone()
+        return default if row is None else row[0]
+
+    def set_count(self, drive: ItemID, nitems: int):
+        """
+        Correct a drive's item count, e.g. from a listing.
+        """
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO destinations (drive, items) VALUES (?, ?) "
+                "ON CONFLICT (drive) DO UPDATE SET items = excluded.items",
+                (drive, nitems),
+            )
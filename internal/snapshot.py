@@ -0,0 +1,202 @@
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .datatypes import File, ItemID
+from .tree import FolderIndex
+
+
+__all__ = (
+    "TreeSnapshot",
+)
+
+ARRAYS = (
+    "ids", "names", "name_offsets", "sizes", "parents", "depths", "is_folder"
+)
+
+
+@dataclass
+class TreeSnapshot:
+    """
+    Columnar snapshot of a listed tree.
+
+    Node ``i`` has ``id_of(i)``, ``name_of(i)``, own size ``sizes[i]`` (0
+    for folders), parent index ``parents[i]`` (-1 for root) and
+    ``depths[i]``. Folders come first, root is node 0.
+
+    Ids are ASCII, stored as fixed-width bytes. Names vary in length, so
+    they are one UTF-8 buffer, name ``i`` spanning
+    ``names[name_offsets[i]:name_offsets[i + 1]]``.
+    """
+    ids: np.ndarray
+    names: np.ndarray
+    name_offsets: np.ndarray
+    sizes: np.ndarray
+    parents: np.ndarray
+    depths: np.ndarray
+    is_folder: np.ndarray
+    _totals: Optional[np.ndarray] = field(default=None, repr=False)
+    _lookup: Optional[dict[ItemID, int]] = field(default=None, repr=False)
+    _children: Optional[dict[int, list[int]]] = \
+        field(default=None, repr=False)
+
+    @classmethod
+    def from_listing(
+        cls,
+        files: Iterable[File],
+        index: FolderIndex
+    ) -> 'TreeSnapshot':
+        # NOTE: Breadth-first from root, so parents precede children and
+        # depth is the parent's plus one.
+        children: dict[ItemID, list[ItemID]] = {}
+        for folder_id, folder in index.folders.items():
+            if folder_id != index.root and folder.parents:
+                children.setdefault(folder.parents[0], []).append(folder_id)
+        folder_ids = [index.root]
+        parents = [-1]
+        depths = [0]
+        for i, folder_id in enumerate(folder_ids):
+            for child in children.get(folder_id, []):
+                folder_ids.append(child)
+                parents.append(i)
+                depths.append(depths[i] + 1)
+        position = {folder_id: i for i, folder_id in enumerate(folder_ids)}
+        ids = list(folder_ids)
+        names = [index.folder(id_).name for id_ in folder_ids]
+        sizes = [0] * len(folder_ids)
+        for file in files:
+            parent = position[index.parent(file)]
+            ids.append(file.id)
+            names.append(file.name)
+            sizes.append(file.size)
+            parents.append(parent)
+            depths.append(depths[parent] + 1)
+        encoded = [name.encode('utf-8') for name in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in encoded], out=offsets[1:])
+        return cls(
+            ids=np.array([id_.encode('ascii') for id_ in ids], dtype=bytes),
+            names=np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            name_offsets=offsets,
+            sizes=np.array(sizes, dtype=np.int64),
+            parents=np.array(parents, dtype=np.int64),
+            depths=np.array(depths, dtype=np.int32),
+            is_folder=np.arange(len(ids)) < len(folder_ids),
+        )
+
+    def save(self, path: str | Path):
+        """
+        Save as a directory of ``.npy`` files.
+        """
+        path = Path(path).expanduser()
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(path / f"{name}.npy", getattr(self, name))
+
+    @classmethod
+    def load(cls, path: str | Path, mmap: bool = True) -> 'TreeSnapshot':
+        path = Path(path).expanduser()
+        mode = 'r' if mmap else None
+        return cls(**{
+            name: np.load(path / f"{name}.npy", mmap_mode=mode)
+            for name in ARRAYS
+        })
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def id_of(self, position: int) -> ItemID:
+        return self.ids[position].decode('ascii')
+
+    def name_of(self, position: int) -> str:
+        start, end = self.name_offsets[position:position + 2]
+        return self.names[start:end].tobytes().decode('utf-8')
+
+    @property
+    def totals(self) -> np.ndarray:
+        """
+        Size of every node in bytes, folders include all descendants.
+        """
+        if self._totals is None:
+            totals = np.array(self.sizes, dtype=np.int64)
+            for depth in range(int(self.depths.max(initial=0)), 0, -1):
+                mask = self.depths == depth
+                totals += np.bincount(
+                    self.parents[mask],
+                    weights=totals[mask],
+                    minlength=len(totals)
+                ).astype(np.int64)
+            self._totals = totals
+        return self._totals
+
+    @property
+    def root(self) -> int:
+        """
+        Position of the root, the only node without a parent.
+        """
+        return int(np.flatnonzero(np.asarray(self.parents) == -1)[0])
+
+    def position(self, item_id: ItemID) -> int:
+        if self._lookup is None:
+            self._lookup = {
+                id_.decode('ascii'): i
+                for i, id_ in enumerate(self.ids.tolist())
+            }
+        return self._lookup[item_id]
+
+    def size_of(self, item_id: ItemID) -> int:
+        return int(self.totals[self.position(item_id)])
+
+    def children(self, position: int) -> list[int]:
+        if self._children is None:
+            children: dict[int, list[int]] = {}
+            for i, parent in enumerate(self.parents.tolist()):
+                children.setdefault(parent, []).append(i)
+            self._children = children
+        return self._children.get(position, [])
+
+    def files_under(
+        self,
+        item_id: ItemID
+    ) -> list[tuple[ItemID, PurePosixPath, int]]:
+        """
+        Return id, path and size of every file in an item's subtree.
+
+        Paths start with the item's own name.
+        """
+        start = self.position(item_id)
+        files = []
+        pending = [(start, PurePosixPath(self.name_of(start)))]
+        while pending:
+            position, path = pending.pop()
+            if not self.is_folder[position]:
+                files.append(
+                    (self.id_of(position), path, int(self.sizes[position]))
+                )
+                continue
+            pending.extend(
+                (child, path / self.name_of(child))
+                for child in self.children(position)
+            )
+        return files
+
+    def largest(
+        self,
+        n: int = 10,
+        *,
+        folders_only: bool = False
+    ) -> list[tuple[str, int]]:
+        """
+        Return names and sizes of the ``n`` largest nodes.
+        """
+        totals = self.totals
+        candidates = np.flatnonzero(self.is_folder) if folders_only \
+            else np.arange(len(totals))
+        n = min(n, len(candidates))
+        if n == 0:
+            return []
+        top = candidates[np.argpartition(totals[candidates], -n)[-n:]]
+        top = top[np.argsort(totals[top])[::-1]]
+        return [(self.name_of(i), int(totals[i])) for i in top]
@@ -0,0 +1,356 @@
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+import json
+import queue
+import re
+import threading
+import time
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+
+import requests
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+from google.auth.transport.requests import AuthorizedSession    # type: ignore
+from google.oauth2.credentials import Credentials    # type: ignore
+
+from .datatypes import FOLDER_MIME_TYPE, File, ItemID, Unit
+
+
+__all__ = (
+    "BufferPool",
+    "TransferError",
+    "TransferResult",
+    "StreamingTransfer",
+)
+
+DRIVE_URL = "https://www.googleapis.com/drive/v3"
+UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3"
+# NOTE: Resumable upload chunks must be multiples of 256 KiB.
+CHUNK_ALIGNMENT = 256 * Unit.KB
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# NOTE: Raised by requests when a connection stalls or drops mid-body.
+RETRY_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+# NOTE: urllib3 reads into a temporary before copying into the buffer,
+# bound it so it stays small whatever the chunk size.
+READ_SIZE = 1 * Unit.MB
+
+
+class TransferError(RuntimeError):
+    pass
+
+
+class TransferResult(NamedTuple):
+    source: ItemID
+    destination: Optional[ItemID]
+    size: int
+    seconds: float
+
+
+class BufferPool:
+    """
+    Fixed set of preallocated chunk buffers, handed out as memoryviews.
+
+    ``acquire`` blocks until a buffer is free, so memory stays at
+    ``count * size`` however large or many the files are.
+    """
+
+    def __init__(self, count: int, size: int):
+        self.size = size
+        self._free: queue.SimpleQueue[memoryview] = queue.SimpleQueue()
+        for _ in range(count):
+            self._free.put(memoryview(bytearray(size)))
+
+    def acquire(self) -> memoryview:
+        return self._free.get()
+
+    def release(self, buffer: memoryview):
+        self._free.put(buffer)
+
+
+def received_bytes(response: requests.Response) -> int:
+    """
+    Bytes an upload session has, from its ``Range: bytes=0-N`` header.
+    """
+    match = re.match(r"bytes=0-(\d+)", response.headers.get("Range", ""))
+    return int(match.group(1)) + 1 if match else 0
+
+
+def chunk_ranges(size: int, chunk_size: int) -> Iterator[tuple[int, int]]:
+    """
+    Yield inclusive ``(start, end)`` byte ranges covering size.
+    """
+    for start in range(0, size, chunk_size):
+        yield start, min(start + chunk_size, size) - 1
+
+
+@dataclass
+class StreamingTransfer:
+    """
+    Copy file content between accounts without server-side copy.
+
+    Each chunk is downloaded with a ranged GET straight into a pooled
+    buffer and uploaded from the same buffer to a resumable upload session.
+    Every file has two buffers, so its next chunk downloads while the
+    current one uploads, with several files in flight at once. Failed
+    chunks are retried, resuming from what the upload session reports as
+    received. Every request has a ``(connect, read)`` ``timeout``, a stalled
+    one is retried like a dropped one. Call ``close`` when done.
+    """
+    source: Optional[Credentials] = None
+    destination: Optional[Credentials] = None
+    chunk_size: int = 32 * Unit.MB
+    max_files: int = 4
+    max_retries: int = 5
+    backoff: float = 1.0
+    timeout: tuple[float, float] = (10.0, 120.0)
+    drive_url: str = DRIVE_URL
+    upload_url: str = UPLOAD_URL
+
+    def __post_init__(self):
+        if self.chunk_size % CHUNK_ALIGNMENT:
+            raise ValueError(
+                f"chunk_size must be a multiple of {CHUNK_ALIGNMENT} bytes."
+            )
+        self.buffers = BufferPool(2 * self.max_files, self.chunk_size)
+        self._acquiring = threading.Lock()
+        self._readers = ThreadPoolExecutor(max_workers=self.max_files)
+        self._local = threading.local()
+
+    def close(self):
+        self._readers.shutdown()
+
+    def _session(self, which: str) -> requests.Session:
+        """
+        Per-thread session for the source or destination account.
+        """
+        session = getattr(self._local, which, None)
+        if session is None:
+            creds = getattr(self, which)
+            session = requests.Session() if creds is None \
+                else AuthorizedSession(creds)
+            setattr(self._local, which, session)
+        return session
+
+    def _retry(
+        self,
+        func: Callable[[], requests.Response]
+    ) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = func()
+            except RETRY_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS:
+                    return response
+                if attempt == self.max_retries:
+                    return response
+            time.sleep(self.backoff * 2 ** attempt)
+        raise AssertionError("unreachable")
+
+    def _download(self, file_id: ItemID, start: int, end: int,
+                  buffer: memoryview) -> memoryview:
+        """
+        Read bytes ``start..end`` of a file into buffer.
+        """
+        session = self._session('source')
+        view = buffer[:end - start + 1]
+        filled = 0
+        failures = 0
+        while filled < len(view):
+            offset = start + filled
+            response = self._retry(lambda: session.get(
+                f"{self.drive_url}/files/{file_id}",
+                params={"alt": "media", "supportsAllDrives": "true"},
+                # NOTE: Raw bytes are read, they must not be compressed.
+                headers={
+                    "Range": f"bytes={offset}-{end}",
+                    "Accept-Encoding": "identity",
+                },
+                stream=True,
+                timeout=self.timeout,
+            ))
+            if response.status_code not in (200, 206) or (
+                response.status_code == 200 and offset
+            ):
+                raise TransferError(
+                    f"Download of {file_id} failed: {response.status_code}"
+                )
+            with response:
+                try:
+                    while filled < len(view):
+                        read = response.raw.readinto(
+                            view[filled:filled + READ_SIZE]
+                        )
+                        if not read:
+                            break
+                        filled += read
+                except (ProtocolError, ReadTimeoutError) as error:
+                    failures += 1
+                    if failures > self.max_retries:
+                        raise TransferError(
+                            f"Download of {file_id} kept failing."
+                        ) from error
+                    # NOTE: Resume from what was read, with a new range.
+                    continue
+            if filled < len(view):
+                failures += 1
+                if failures > self.max_retries:
+                    raise TransferError(f"Download of {file_id} cut short.")
+        return view
+
+    def _start_upload(self, file: File, parent: ItemID) -> str:
+        session = self._session('destination')
+        response = self._retry(lambda: session.post(
+            f"{self.upload_url}/files",
+            params={"uploadType": "resumable", "supportsAllDrives": "true"},
+            headers={
+                "X-Upload-Content-Length": str(file.size),
+                "X-Upload-Content-Type": file.mimeType,
+                "Content-Type": "application/json; charset=UTF-8",
+            },
+            data=json.dumps({"name": file.name, "parents": [parent]}),
+            timeout=self.timeout,
+        ))
+        if response.status_code != 200:
+            raise TransferError(
+                f"Upload of {file.name} not started: {response.status_code}"
+            )
+        return response.headers["Location"]
+
+    def _received(self, session_url: str, size: int) -> int:
+        """
+        Ask the upload session how many bytes it has, to resume from.
+        """
+        session = self._session('destination')
+        response = self._retry(lambda: session.put(
+            session_url, headers={"Content-Range": f"bytes */{size}"},
+            timeout=self.timeout,
+        ))
+        if response.status_code in (200, 201):
+            return size
+        return received_bytes(response)
+
+    def _upload(self, session_url: str, start: int, view: memoryview,
+                size: int) -> Optional[dict]:
+        """
+        Upload one chunk, resuming mid-chunk after a failure.
+        """
+        session = self._session('destination')
+        end = start + len(view) - 1
+        sent = start
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = session.put(
+                    session_url,
+                    data=view[sent - start:],
+                    headers={"Content-Range": f"bytes {sent}-{end}/{size}"},
+                    timeout=self.timeout,
+                )
+            except RETRY_ERRORS:
+                response = None
+            if response is not None:
+                if response.status_code in (200, 201):
+                    return response.json()
+                if response.status_code == 308:
+                    received = received_bytes(response)
+                    if received > end:
+                        return None
+                    sent = received
+                    continue
+                if response.status_code not in RETRY_STATUS:
+                    raise TransferError(
+                        f"Chunk {start}-{end} failed: {response.status_code}"
+                    )
+            time.sleep(self.backoff * 2 ** attempt)
+            sent = max(self._received(session_url, size), start)
+            if sent > end:
+                return None
+        raise TransferError(f"Chunk {start}-{end} failed after retries.")
+
+    def make_folder(self, name: str, parent: ItemID) -> ItemID:
+        response = self._retry(lambda: self._session('destination').post(
+            f"{self.drive_url}/files",
+            params={"supportsAllDrives": "true", "fields": "id"},
+            json={
+                "name": name,
+                "mimeType": FOLDER_MIME_TYPE,
+                "parents": [parent],
+            },
+            timeout=self.timeout,
+        ))
+        if response.status_code != 200:
+            raise TransferError(
+                f"Folder {name} not created: {response.status_code}"
+            )
+        return response.json()['id']
+
+    def copy_file(self, file: File, parent: ItemID) -> TransferResult:
+        start_time = time.perf_counter()
+        session_url = self._start_upload(file, parent)
+        created: Optional[dict] = None
+        if file.size == 0:
+            session = self._session('destination')
+            response = self._retry(lambda: session.put(
+                session_url, data=b'', timeout=self.timeout
+            ))
+            if response.status_code not in (200, 201):
+                raise TransferError(
+                    f"Upload of {file.name} failed: {response.status_code}"
+                )
+            created = response.json()
+        ranges = list(chunk_ranges(file.size, self.chunk_size))
+        # NOTE: Both at once, a thread holding one while waiting for the
+        # other could starve the rest.
+        with self._acquiring:
+            buffers = [self.buffers.acquire(), self.buffers.acquire()]
+        pending: Optional[Future[memoryview]] = None
+        try:
+            if ranges:
+                pending = self._readers.submit(
+                    self._download, file.id, *ranges[0], buffers[0]
+                )
+            for n, (start, _) in enumerate(ranges):
+                assert pending is not None
+                view = pending.result()
+                pending = None
+                if n + 1 < len(ranges):
+                    pending = self._readers.submit(
+                        self._download, file.id, *ranges[n + 1],
+                        buffers[(n + 1) % 2]
+                    )
+                created = self._upload(session_url, start, view, file.size)
+        finally:
+            # NOTE: The next chunk may still be downloading into a buffer.
+            if pending is not None:
+                wait([pending])
+            for buffer in buffers:
+                self.buffers.release(buffer)
+        return TransferResult(
+            file.id,
+            None if created is None else created.get('id'),
+            file.size,
+            time.perf_counter() - start_time,
+        )
+
+    def copy(
+        self,
+        files: Iterable[tuple[File, ItemID]],
+        callback: Optional[Callable[[TransferResult], None]] = None
+    ) -> list[TransferResult]:
+        """
+        Copy ``(file, destination parent)`` pairs, ``max_files`` at a time.
+        """
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_files) as executor:
+            for result in executor.map(
+                lambda pair: self.copy_file(*pair), files
+            ):
+                if callback is not None:
+                    callback(result)
+                results.append(result)
+        return results
@@ -0,0 +1,85 @@
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import Any, Optional
+
+from .datatypes import FOLDER_MIME_TYPE, Folder, Item, ItemID
+
+
+__all__ = (
+    "FolderIndex",
+)
+
+
+@dataclass
+class FolderIndex:
+    """
+    Map of folder id to folder and its path relative to the listed root.
+
+    Built from the ``folderTree`` of a recursive listing, so lookups need
+    no further API calls.
+    """
+    root: ItemID
+    folders: dict[ItemID, Folder] = field(default_factory=dict)
+    paths: dict[ItemID, PurePosixPath] = field(default_factory=dict)
+
+    @classmethod
+    def from_filelist(cls, result: dict[str, Any]) -> 'FolderIndex':
+        """
+        Build index from the result of ``getfilelist.GetFileList``.
+
+        ``folderTree['id'][i]`` is the chain of ids from root to folder
+        ``i``, and ``folderTree['names'][i]`` is that folder's own name.
+        """
+        tree = result['folderTree']
+        root = tree['folders'][0]
+        names = dict(zip(tree['folders'], tree['names']))
+        index = cls(root)
+        for ids, name in zip(tree['id'], tree['names']):
+            folder_id = ids[-1]
+            parents = [ids[-2]] if len(ids) > 1 else []
+            index.folders[folder_id] = Folder(
+                id=folder_id,
+                name=name or '',
+                mimeType=FOLDER_MIME_TYPE,
+                parents=parents,
+            )
+            index.paths[folder_id] = PurePosixPath(
+                '.', *(names[id_] for id_ in ids[1:])
+            )
+        return index
+
+    def add(self, folder: Folder, parent: Optional[ItemID] = None):
+        """
+        Add a folder under parent, or as root without one.
+        """
+        self.folders[folder.id] = folder.copy(
+            update={"parents": [] if parent is None else [parent]}
+        )
+        self.paths[folder.id] = PurePosixPath('.') if parent is None \
+            else self.paths[parent] / folder.name
+
+    def __contains__(self, folder_id: ItemID) -> bool:
+        return folder_id in self.paths
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def folder(self, folder_id: ItemID) -> Folder:
+        return self.folders[folder_id]
+
+    def path(self, folder_id: ItemID) -> PurePosixPath:
+        """
+        Path of a folder relative to root, root itself is ``.``.
+        """
+        return self.paths[folder_id]
+
+    def parent(self, item: Item) -> ItemID:
+        """
+        First parent of an item inside the tree.
+
+        Items with several parents may list one outside the tree first.
+        """
+        for parent in item.parents:
+            if parent in self.paths:
+                return parent
+        raise KeyError(f"No parent of {item.id} in tree of {self.root}.")
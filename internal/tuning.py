@@ -0,0 +1,179 @@
+from dataclasses import asdict, dataclass, field
+import json
+from pathlib import Path
+from statistics import median
+import time
+from typing import Iterable, Literal, Optional
+
+from .datatypes import Unit
+from .quota import QuotaLedger
+
+
+__all__ = (
+    "RcloneTuning",
+    "TuningHistory",
+    "size_class",
+    "tune",
+)
+
+SizeClass = Literal['small', 'medium', 'large']
+
+# NOTE: transfers * chunk size is roughly rclone's upload buffer memory.
+MEMORY_BUDGET: int = 2 * Unit.GB
+
+
+@dataclass(frozen=True)
+class RcloneTuning:
+    transfers: int
+    checkers: int
+    chunk_size: int
+    tpslimit: int
+    # NOTE: None leaves the scheduled service account range as is.
+    sa_count: Optional[int] = None
+
+    def args(self) -> list[str]:
+        """
+        Arguments for rclone_sa_magic, forwarded to rclone.
+        """
+        return [
+            "--transfers", str(self.transfers),
+            "--checkers", str(self.checkers),
+            "--drive_chunk_size", f"{self.chunk_size // Unit.MB}M",
+            "--tpslimit", str(self.tpslimit),
+        ]
+
+
+DEFAULTS: dict[SizeClass, RcloneTuning] = {
+    # NOTE: Many small files are bound by per-file API latency.
+    'small': RcloneTuning(
+        transfers=32, checkers=64, chunk_size=8 * Unit.MB, tpslimit=12
+    ),
+    'medium': RcloneTuning(
+        transfers=8, checkers=16, chunk_size=64 * Unit.MB, tpslimit=6
+    ),
+    # NOTE: Few large files are bound by bandwidth, extra transfers only
+    # cost chunk buffers.
+    'large': RcloneTuning(
+        transfers=4, checkers=8, chunk_size=256 * Unit.MB, tpslimit=3
+    ),
+}
+
+
+def size_class(sizes: Iterable[int]) -> SizeClass:
+    sizes = list(sizes)
+    if not sizes:
+        return 'medium'
+    mid = median(sizes)
+    if mid < 16 * Unit.MB:
+        return 'small'
+    if mid < 512 * Unit.MB:
+        return 'medium'
+    return 'large'
+
+
+@dataclass
+class TuningHistory:
+    """
+    Past copies as JSON lines: size class, settings and throughput.
+    """
+    path: Path = Path('tuning.jsonl')
+    records: list[dict] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, path: str | Path = 'tuning.jsonl') -> 'TuningHistory':
+        path = Path(path).expanduser()
+        records = []
+        if path.exists():
+            with open(path, encoding='utf-8') as fh:
+                records = [json.loads(line) for line in fh if line.strip()]
+        return cls(path, records)
+
+    def record(
+        self,
+        profile: SizeClass,
+        tuning: RcloneTuning,
+        *,
+        nbytes: int,
+        nfiles: int,
+        seconds: float
+    ):
+        record = {
+            "ts": time.time(),
+            "profile": profile,
+            "tuning": asdict(tuning),
+            "bytes": nbytes,
+            "files": nfiles,
+            "seconds": seconds,
+            "throughput": nbytes / seconds if seconds > 0 else 0.0,
+        }
+        self.records.append(record)
+        with open(self.path, 'a', encoding='utf-8') as fh:
+            fh.write(json.dumps(record) + '\n')
+
+    def best(self, profile: SizeClass) -> Optional[RcloneTuning]:
+        """
+        Settings which copied the most files per second for a size class.
+
+        Files per second, not bytes, so clusters of different sizes within
+        a class compare fairly. Settings the cluster capped are not reused.
+        """
+        past = [
+            rec for rec in self.records
+            if rec['profile'] == profile and rec['seconds'] > 0
+        ]
+        if not past:
+            return None
+        best = max(past, key=lambda rec: rec['files'] / rec['seconds'])
+        fields = dict(best['tuning'], sa_count=None)
+        # NOTE: tune caps transfers at the file count, a cap only says how
+        # small that cluster was.
+        if fields['transfers'] >= best['files']:
+            fields['transfers'] = DEFAULTS[profile].transfers
+            fields['checkers'] = DEFAULTS[profile].checkers
+        return RcloneTuning(**fields)
+
+
+def tune(
+    sizes: Iterable[int],
+    *,
+    history: Optional[TuningHistory] = None,
+    ledger: Optional[QuotaLedger] = None,
+    sa_range: tuple[int, int] = (1, 600),
+    memory_budget: int = MEMORY_BUDGET
+) -> tuple[SizeClass, RcloneTuning]:
+    """
+    Choose rclone settings from a cluster's file sizes.
+
+    Start from the best past settings for the same size class, else the
+    defaults, and keep buffers within ``memory_budget``. With a ``ledger``,
+    pick enough service accounts from ``sa_range`` for the total, by the
+    quota each has left.
+    """
+    sizes = list(sizes)
+    profile = size_class(sizes)
+    base = None if history is None else history.best(profile)
+    if base is None:
+        base = DEFAULTS[profile]
+
+    transfers = max(1, min(base.transfers, len(sizes) or 1))
+    chunk_size = base.chunk_size
+    while transfers * chunk_size > memory_budget and chunk_size > 8 * Unit.MB:
+        chunk_size //= 2
+    transfers = max(1, min(transfers, memory_budget // chunk_size))
+
+    sa_count = None
+    if ledger is not None:
+        sa_begin, sa_end = sa_range
+        # NOTE: One spare in case an account is rate limited early.
+        sa_count = min(
+            ledger.accounts_for(sum(sizes), sa_begin, sa_end) + 1,
+            sa_end - sa_begin + 1
+        )
+
+    return profile, RcloneTuning(
+        transfers=transfers,
+        checkers=max(base.checkers, transfers),
+        chunk_size=chunk_size,
+        tpslimit=base.tpslimit,
+        sa_count=sa_count,
+    )
@@ -0,0 +1,232 @@
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+import json
+from pathlib import Path
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Iterator, Literal, NamedTuple, Optional
+import uuid
+
+
+__all__ = (
+    "Lease",
+    "ClusterQueue",
+    "LeaseLost",
+)
+
+State = Literal['pending', 'leased', 'done', 'failed']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clusters (
+    name TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    token TEXT,
+    expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+)
+"""
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+class Lease(NamedTuple):
+    name: str
+    token: str
+    payload: dict[str, Any]
+    expires: float
+    # NOTE: Set by ``ClusterQueue.hold`` once the lease can't be extended.
+    lost: threading.Event
+
+    def check(self):
+        """
+        Raise ``LeaseLost`` if the lease was lost, call between stages.
+        """
+        if self.lost.is_set():
+            raise LeaseLost(f"Lease on {self.name} was lost.")
+
+
+@dataclass
+class ClusterQueue:
+    """
+    Planned clusters shared by workers on several hosts, in SQLite.
+
+    A worker ``acquire``s a time-limited lease on one pending cluster and
+    keeps it with ``heartbeat``. Expired leases go back to pending, so a
+    crashed worker's cluster is picked up again, and every update checks
+    the lease token, so a cluster is never worked on twice at once.
+    """
+    path: Path = Path('clusters.sqlite')
+    lease_seconds: float = 15 * 60
+    max_attempts: int = 3
+    worker: str = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+
+    def __post_init__(self):
+        self.path = Path(self.path).expanduser()
+        with self._connect() as db:
+            db.execute(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # NOTE: Autocommit, acquire begins its own transaction.
+        with closing(sqlite3.connect(
+            self.path, timeout=30, isolation_level=None
+        )) as db:
+            yield db
+
+    def put(self, name: str, payload: dict[str, Any]):
+        """
+        Add a planned cluster, existing clusters are left untouched.
+        """
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR IGNORE INTO clusters (name, payload) VALUES (?, ?)",
+                (name, json.dumps(payload)),
+            )
+
+    def acquire(self) -> Optional[Lease]:
+        """
+        Lease the next pending or expired cluster, ``None`` if none left.
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        expires = now + self.lease_seconds
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                lease = self._acquire(db, now, token, expires)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        return lease
+
+    def _acquire(
+        self,
+        db: sqlite3.Connection,
+        now: float,
+        token: str,
+        expires: float
+    ) -> Optional[Lease]:
+        db.execute(
+            "UPDATE clusters SET state = 'failed', token = NULL, "
+            "error = 'lease expired' WHERE state = 'leased' "
+            "AND expires < ? AND attempts >= ?",
+            (now, self.max_attempts),
+        )
+        row = db.execute(
+            "SELECT name, payload FROM clusters "
+            "WHERE state = 'pending' OR (state = 'leased' AND expires < ?) "
+            "ORDER BY rowid LIMIT 1",
+            (now,),
+        ).fetchone()
+        if row is None:
+            return None
+        name, payload = row
+        db.execute(
+            "UPDATE clusters SET state = 'leased', worker = ?, "
+            "token = ?, expires = ?, attempts = attempts + 1 "
+            "WHERE name = ?",
+            (self.worker, token, expires, name),
+        )
+        return Lease(
+            name, token, json.loads(payload), expires, threading.Event()
+        )
+
+    def _update(self, lease: Lease, sql: str, *params: Any) -> bool:
+        with self._connect() as db:
+            cursor = db.execute(
+                f"{sql} WHERE name = ? AND token = ? AND state = 'leased'",
+                (*params, lease.name, lease.token),
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, lease: Lease) -> bool:
+        """
+        Extend a lease, ``False`` if it was lost to another worker.
+        """
+        return self._update(
+            lease, "UPDATE clusters SET expires = ?",
+            time.time() + self.lease_seconds,
+        )
+
+    def complete(self, lease: Lease) -> bool:
+        return self._update(
+            lease, "UPDATE clusters SET state = 'done', token = NULL"
+        )
+
+    def release(self, lease: Lease, error: Optional[str] = None) -> bool:
+        """
+        Give a cluster back, failed for good after ``max_attempts``.
+        """
+        return self._update(
+            lease,
+            "UPDATE clusters SET token = NULL, error = ?, "
+            "state = CASE WHEN attempts >= ? THEN 'failed' "
+            "ELSE 'pending' END",
+            error, self.max_attempts,
+        )
+
+    @contextmanager
+    def hold(
+        self,
+        lease: Lease,
+        every: Optional[float] = None
+    ) -> Iterator[Lease]:
+        """
+        Heartbeat a lease from a background thread while in the block.
+
+        A failed heartbeat is retried until the lease would expire, then
+        ``lease.lost`` is set, as it is when another worker took over. The
+        cluster is completed on success and released on error. Raise
+        ``LeaseLost`` at the end if the lease was lost meanwhile.
+        """
+        interval = every or self.lease_seconds / 3
+        retry = min(interval, 10.0)
+        stop = threading.Event()
+
+        def beat():
+            expires = lease.expires
+            wait = interval
+            while not stop.wait(wait):
+                try:
+                    extended = self.heartbeat(lease)
+                except Exception:
+                    # NOTE: e.g. the database locked or its share offline.
+                    if time.time() + retry >= expires:
+                        lease.lost.set()
+                        return
+                    wait = retry
+                    continue
+                if not extended:
+                    lease.lost.set()
+                    return
+                expires = time.time() + self.lease_seconds
+                wait = interval
+
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+        try:
+            yield lease
+        except BaseException as error:
+            stop.set()
+            beater.join()
+            self.release(lease, error=repr(error))
+            raise
+        stop.set()
+        beater.join()
+        if lease.lost.is_set() or not self.complete(lease):
+            raise LeaseLost(f"Lease on {lease.name} was lost.")
+
+    def counts(self) -> dict[State, int]:
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT state, COUNT(*) FROM clusters GROUP BY state"
+            ).fetchall()
+        return dict(rows)
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+# NOTE: internal reads these on import, the tests make no API calls.
+os.environ.setdefault("TOKEN", "token.json")
+os.environ.setdefault("CREDS", "credentials.json")
+
+
+@pytest.fixture
+def drive():
+    """
+    DriveService without credentials, API calls must be stubbed.
+    """
+    from internal.datatypes import SupportRich
+    from internal.pool import ClientPool
+    from internal.service import DriveService
+
+    service = DriveService.__new__(DriveService)
+    SupportRich.__post_init__(service)
+    service.verbose = False
+    service._pool = ClientPool(None, max_workers=4)
+    yield service
+    service._pool.close()
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from internal.datatypes import FOLDER_MIME_TYPE, File, Folder
+from internal.filters import ItemFilter
+
+WHERE = ItemFilter(
+    exclude_names=frozenset({"Sample's"}),
+    exclude_globs=("*.nfo",),
+    mime_types=frozenset({"video/mp4"}),
+    min_size=10,
+    modified_after=datetime(2020, 1, 1),
+)
+
+
+def folder(name):
+    return Folder(id="f", name=name, mimeType=FOLDER_MIME_TYPE, parents=["p"])
+
+
+def video(name, size, mime="video/mp4"):
+    return File(id="v", name=name, mimeType=mime, size=str(size),
+                parents=["p"])
+
+
+def test_query():
+    assert ItemFilter(trashed=None).query() == ""
+    assert ItemFilter().query() == "trashed = false"
+    assert WHERE.query() == (
+        "name != 'Sample\\'s' and trashed = false"
+        " and (mimeType = 'video/mp4')"
+        " and modifiedTime > '2020-01-01T00:00:00'"
+    )
+
+
+def test_folder_query_skips_file_clauses():
+    assert WHERE.folder_query() == "name != 'Sample\\'s' and trashed = false"
+    assert WHERE.and_query("'p' in parents", folders=True) == (
+        "('p' in parents) and name != 'Sample\\'s' and trashed = false"
+        f" and (mimeType = '{FOLDER_MIME_TYPE}' or ((mimeType = 'video/mp4')"
+        " and modifiedTime > '2020-01-01T00:00:00'))"
+    )
+    assert ItemFilter().and_query("q", folders=True) == \
+        "(q) and trashed = false"
+
+
+def test_matches_folders_by_name_only():
+    assert WHERE.matches(folder("Films"))
+    assert WHERE.matches(folder("Films"), size=0)
+    assert not WHERE.matches(folder("Sample's"))
+    assert WHERE.matches(video("a.mp4", 10))
+    assert not WHERE.matches(video("a.mp4", 9))
+    assert not WHERE.matches(video("a.mkv", 10, "video/x-matroska"))
+    assert not WHERE.matches(video("a.nfo", 10))
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta, timezone
+import random
+import re
+import threading
+
+from internal.service import split_range, within
+
+BASE = datetime(2020, 1, 1, tzinfo=timezone.utc)
+PAGE = 1000
+
+
+def parse_bounds(query):
+    bounds = []
+    for op in (">=", "<"):
+        match = re.search(rf"createdTime {op} '([^']+)'", query)
+        bounds.append(match and datetime.fromisoformat(match[1]).replace(
+            tzinfo=timezone.utc
+        ))
+    return bounds
+
+
+class FakeFolder:
+    """
+    One flat folder, queried as Drive would by createdTime range.
+    """
+
+    def __init__(self, items):
+        self.items = sorted(items, key=lambda item: item['createdTime'])
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def select(self, query):
+        low, high = parse_bounds(query)
+        return [
+            item for item in self.items
+            if (low is None or created(item) >= low)
+            and (high is None or created(item) < high)
+        ]
+
+    def first_page(self, query, fields):
+        assert "createdTime" in fields
+        with self._lock:
+            self.requests += 1
+        found = self.select(query)
+        return found[:PAGE], len(found) > PAGE
+
+    def list_query(self, query, fields):
+        found = self.select(query)
+        with self._lock:
+            self.requests += len(found) // PAGE + 1
+        return found
+
+
+def created(item):
+    return datetime.fromisoformat(item['createdTime'])
+
+
+def item(n, when):
+    return {
+        "id": str(n), "name": f"{n}.mkv", "mimeType": "video/x-matroska",
+        "parents": ["p"], "size": "1",
+        "createdTime": when.isoformat(timespec='milliseconds').replace(
+            '+00:00', 'Z'
+        ),
+    }
+
+
+def listed(drive, folder):
+    drive._first_page = folder.first_page
+    drive._list_query = folder.list_query
+    return drive._list_partitioned("'p' in parents")
+
+
+def test_small_folder_takes_one_request(drive):
+    folder = FakeFolder([item(n, BASE + timedelta(days=n)) for n in range(10)])
+    assert len(listed(drive, folder)) == 10
+    assert folder.requests == 1
+
+
+def test_large_folder_lists_every_item_once(drive):
+    rng = random.Random(1)
+    items = [
+        item(n, BASE + timedelta(seconds=rng.randint(0, 3 * 10 ** 7)))
+        for n in range(20_000)
+    ]
+    # NOTE: A burst created within one second, more than a page.
+    items += [
+        item(n, BASE + timedelta(days=100, microseconds=n))
+        for n in range(20_000, 25_000)
+    ]
+    folder = FakeFolder(items)
+    found = listed(drive, folder)
+    assert sorted(int(i['id']) for i in found) == list(range(25_000))
+    # NOTE: Split points cost some partly filled pages.
+    assert folder.requests < 3 * len(items) // PAGE
+
+
+def test_within_and_split_range():
+    assert within("q", None, None) == "q"
+    assert within("a or b", BASE, None) == \
+        "(a or b) and createdTime >= '2020-01-01T00:00:00'"
+
+    high = BASE + timedelta(seconds=10)
+    parts = split_range(BASE, high, 4)
+    assert parts[0][0] == BASE and parts[-1][1] == high
+    assert all(stop == start for (_, stop), (start, _)
+               in zip(parts, parts[1:]))
+    # NOTE: Never finer than a second.
+    assert split_range(BASE, BASE + timedelta(seconds=1), 8) == \
+        [(BASE, BASE + timedelta(seconds=1))]
+    assert split_range(BASE, None, 3)[-1][1] is None
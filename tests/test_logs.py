@@ -0,0 +1,35 @@
+import json
+import threading
+
+from internal.logs import StructuredLog
+
+
+def writers():
+    return [t for t in threading.enumerate() if t.name == "structured-log"]
+
+
+def test_writer_starts_on_first_event(tmp_path):
+    before = len(writers())
+    log = StructuredLog(tmp_path / 'events.jsonl')
+    assert len(writers()) == before
+    assert not log.path.exists()
+
+    log.write("copy", "start", cluster="Films_1")
+    log.write("copy", "start", cluster="Films_2")
+    log.close()
+    assert len(writers()) == before
+    lines = log.path.read_text().splitlines()
+    assert [json.loads(line)["cluster"] for line in lines] == \
+        ["Films_1", "Films_2"]
+    assert log.summary() == {"copy": {"start": 2}}
+
+
+def test_record_without_objects_is_quiet(drive, tmp_path):
+    drive.events = StructuredLog(None)
+    drive.verbose = True
+    logged = []
+    drive.progress.log = lambda *objects, **kwargs: logged.append(objects)
+    drive.record("copy", "polled")
+    drive.record("copy", "failed", "copy failed", error=ValueError())
+    assert logged == [("copy failed",)]
+    assert drive.events.summary() == {"copy": {"failed": 1, "polled": 1}}
@@ -0,0 +1,21 @@
+import json
+from pathlib import PurePosixPath
+
+from internal.manifest import Manifest, ManifestEntry
+
+
+def test_header_counts(tmp_path):
+    manifest = Manifest("Films_1", [
+        ManifestEntry("a", PurePosixPath("a.mkv"), 10),
+        ManifestEntry("d", PurePosixPath("Films/Season 1/d.mkv"), 40),
+        ManifestEntry("e", PurePosixPath("Films/Season 1/e.srt"), 5),
+    ])
+    path = manifest.attach("folder1", tmp_path)
+    with open(path, encoding='utf-8') as fh:
+        header = json.loads(next(fh))
+    assert header == {"name": "Films_1", "folder": "folder1",
+                      "nfiles": 3, "nitems": 5, "size": 55}
+
+    loaded = Manifest.for_folder("folder1", tmp_path)
+    assert loaded == manifest
+    assert (len(loaded), loaded.nfolders, loaded.nitems) == (3, 2, 5)
@@ -0,0 +1,32 @@
+import time
+
+from googleapiclient.http import HttpRequest
+
+from internal.pool import ClientPool
+from internal.profiling import Profiler
+
+
+def test_worker_api_wait_goes_to_submitting_stage(tmp_path, monkeypatch):
+    monkeypatch.setattr(HttpRequest, "execute",
+                        lambda request: time.sleep(0.01))
+    profiler = Profiler(tmp_path)
+    profiler.install()
+    pool = ClientPool(None, max_workers=4)
+    try:
+        with profiler.stage("COPY"):
+            with profiler.stage("copy"):
+                pool.map(lambda _: HttpRequest.execute(None), range(8))
+            HttpRequest.execute(None)
+        # NOTE: Outside any stage, workers add to none.
+        pool.map(lambda _: HttpRequest.execute(None), range(2))
+    finally:
+        pool.close()
+        profiler.uninstall()
+
+    report = profiler.report()
+    assert report["copy"]["api_calls"] == 0
+    assert report["copy"]["worker_api_calls"] == 8
+    assert report["copy"]["worker_api_wait"] >= 0.08
+    assert report["COPY"]["api_calls"] == 1
+    assert report["COPY"]["worker_api_calls"] == 8
+    assert (tmp_path / "stages.json").exists()
@@ -0,0 +1,60 @@
+from internal.datatypes import Unit
+from internal.quota import DAILY_QUOTA, WINDOW, QuotaLedger, schedule_transfer
+
+NOW = 1_000_000.0
+
+
+def ledger(tmp_path, **used):
+    quota = QuotaLedger(path=tmp_path / 'quota.json')
+    for sa, nbytes in used.items():
+        quota.record(int(sa.lstrip('sa')), nbytes, now=NOW - 60)
+    return quota
+
+
+def test_used_and_prune(tmp_path):
+    quota = ledger(tmp_path)
+    quota.record(1, 100 * Unit.GB, now=NOW - WINDOW - 1)
+    quota.record(1, 50 * Unit.GB, now=NOW - 10)
+    quota.record(2, 0, now=NOW)
+    assert quota.used(1, now=NOW) == 50 * Unit.GB
+    assert quota.available(1, now=NOW) == DAILY_QUOTA - 50 * Unit.GB
+    assert quota.available(3, now=NOW) == DAILY_QUOTA
+
+    quota.prune(now=NOW)
+    assert quota.entries == {1: [(NOW - 10, 50 * Unit.GB)]}
+
+
+def test_save_load_round_trip(tmp_path):
+    quota = ledger(tmp_path)
+    quota.record(7, 3 * Unit.GB)
+    quota.save()
+    loaded = QuotaLedger.load(tmp_path / 'quota.json')
+    assert loaded.entries == quota.entries
+    assert QuotaLedger.load(tmp_path / 'missing.json').entries == {}
+
+
+def test_accounts_for_partly_used(tmp_path):
+    quota = ledger(tmp_path, sa1=700 * Unit.GB, sa2=600 * Unit.GB)
+    assert quota.accounts_for(40 * Unit.GB, 1, 10, now=NOW) == 1
+    assert quota.accounts_for(300 * Unit.GB, 1, 10, now=NOW) == 3
+    assert quota.accounts_for(10 * DAILY_QUOTA, 1, 4, now=NOW) == 4
+
+
+def test_schedule_skips_exhausted_start(tmp_path):
+    quota = ledger(tmp_path, sa1=DAILY_QUOTA, sa2=745 * Unit.GB)
+    plan = schedule_transfer(quota, sa_begin=1, sa_end=10,
+                             max_cluster_size=600 * Unit.GB, now=NOW)
+    assert plan == (600 * Unit.GB, 3, 3)
+
+
+def test_schedule_stops_at_exhausted_account(tmp_path):
+    quota = ledger(tmp_path, sa1=500 * Unit.GB, sa3=DAILY_QUOTA)
+    plan = schedule_transfer(quota, sa_begin=1, sa_end=10,
+                             max_cluster_size=2000 * Unit.GB, now=NOW)
+    # NOTE: The range must be contiguous, so it ends before account 3.
+    assert plan == (250 * Unit.GB + DAILY_QUOTA, 1, 2)
+
+
+def test_schedule_all_exhausted(tmp_path):
+    quota = ledger(tmp_path, sa1=DAILY_QUOTA, sa2=DAILY_QUOTA)
+    assert schedule_transfer(quota, sa_begin=1, sa_end=2, now=NOW) is None
@@ -0,0 +1,39 @@
+from internal.sharding import DestinationShards
+
+
+def shards(tmp_path, *destinations):
+    return DestinationShards(destinations, tmp_path / 'clusters.sqlite',
+                             limit=1000, headroom=1.0)
+
+
+def test_assign_emptiest_that_fits(tmp_path):
+    dests = shards(tmp_path, "a", "b")
+    assert dests.uncounted() == ["a", "b"]
+    dests.set_count("a", 300)
+    dests.set_count("b", 600)
+    assert dests.uncounted() == []
+
+    assert dests.assign("folder1", 500) == "a"
+    assert dests.counts() == {"a": 800, "b": 600}
+    assert dests.assign("folder2", 300) == "b"
+    assert dests.assign("folder3", 300) is None
+    assert dests.destination("folder3", "a") == "a"
+
+
+def test_assignment_is_kept(tmp_path):
+    dests = shards(tmp_path, "a", "b")
+    assert dests.assign("folder1", 100) == "a"
+    # NOTE: Retried copies keep their drive and count once.
+    assert dests.assign("folder1", 100) == "a"
+    assert dests.counts() == {"a": 100, "b": 0}
+    assert dests.destination("folder1") == "a"
+    assert dests.destination("folder2") is None
+
+
+def test_only_configured_destinations(tmp_path):
+    shards(tmp_path, "old").set_count("old", 0)
+    dests = shards(tmp_path, "new")
+    assert dests.counts() == {"new": 0}
+    assert dests.uncounted() == ["new"]
+    assert dests.assign("folder1", 10) == "new"
+    assert dests.room("new") == 990
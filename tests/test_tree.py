@@ -0,0 +1,128 @@
+from pathlib import PurePosixPath
+
+import pytest
+
+from internal.datatypes import File
+from internal.merkle import TreeDigest, diff_trees
+from internal.planner import plan
+from internal.snapshot import TreeSnapshot
+from internal.tree import FolderIndex
+
+
+def file(id_, name, size, *parents):
+    # NOTE: Drive returns sizes as strings.
+    return {
+        "id": id_, "name": name, "size": str(size), "parents": list(parents),
+        "mimeType": "video/mp4", "md5Checksum": f"md5-{name}-{size}",
+    }
+
+
+def filelist(root="root", films_1="Films_1"):
+    """
+    Result shaped like ``getfilelist.GetFileList`` output.
+    """
+    chains = [
+        [root],
+        [root, "f1"],
+        [root, "f2"],
+        [root, "f1", "s1"],
+    ]
+    names = ["Films", films_1, "Films_2", "Season 1"]
+    files = {
+        root: [file("a", "a.mkv", 10, root)],
+        "f1": [file("b", "b.mkv", 20, "f1")],
+        "f2": [file("c", "c.mkv", 30, "elsewhere", "f2")],
+        "s1": [file("d", "d.mkv", 40, "s1"), file("e", "e.srt", 5, "s1")],
+    }
+    return {
+        "searchedFolder": {"id": root, "name": "Films"},
+        "folderTree": {
+            "id": chains,
+            "names": names,
+            "folders": [chain[-1] for chain in chains],
+        },
+        "fileList": [
+            {"folderTree": chain, "files": files[chain[-1]]}
+            for chain in chains
+        ],
+        "totalNumberOfFolders": len(chains),
+        "totalNumberOfFiles": sum(map(len, files.values())),
+    }
+
+
+def listing(result):
+    files = [File(**item) for batch in result['fileList']
+             for item in batch['files']]
+    return files, FolderIndex.from_filelist(result)
+
+
+def test_paths_and_names():
+    index = FolderIndex.from_filelist(filelist())
+    assert index.root == "root"
+    assert index.path("root") == PurePosixPath(".")
+    assert index.path("f1") == PurePosixPath("Films_1")
+    assert index.path("s1") == PurePosixPath("Films_1/Season 1")
+    assert index.folder("s1").name == "Season 1"
+    assert index.folder("s1").parents == ["f1"]
+    assert index.folder("root").parents == []
+
+
+def test_parent_in_tree():
+    files, index = listing(filelist())
+    by_id = {file.id: file for file in files}
+    assert index.parent(by_id["c"]) == "f2"
+    with pytest.raises(KeyError):
+        index.parent(File(id="x", name="x", mimeType="video/mp4", size=1,
+                          parents=["elsewhere"]))
+
+
+def test_snapshot_totals():
+    snapshot = TreeSnapshot.from_listing(*listing(filelist()))
+    assert snapshot.size_of("root") == 105
+    assert snapshot.size_of("f1") == 65
+    assert snapshot.size_of("s1") == 45
+    assert int(snapshot.depths[snapshot.position("s1")]) == 2
+    assert int(snapshot.depths[snapshot.position("d")]) == 3
+
+
+def test_snapshot_names_round_trip(tmp_path):
+    long_name = "Épisode " + "x" * 300
+    snapshot = TreeSnapshot.from_listing(
+        *listing(filelist(films_1=long_name))
+    )
+    # NOTE: One long name must not widen every entry.
+    assert snapshot.names.nbytes == sum(
+        len(snapshot.name_of(i).encode()) for i in range(len(snapshot))
+    )
+    snapshot.save(tmp_path)
+    loaded = TreeSnapshot.load(tmp_path)
+    assert loaded.name_of(loaded.position("f1")) == long_name
+    assert sorted(path for _, path, _ in loaded.files_under("s1")) == \
+        [PurePosixPath("Season 1/d.mkv"), PurePosixPath("Season 1/e.srt")]
+
+
+def test_digest_matches_renamed_root():
+    source = TreeDigest(*listing(filelist()))
+    destination = TreeDigest(*listing(filelist(root="copy")))
+    assert diff_trees(source, destination) == []
+
+    changed = TreeDigest(*listing(filelist(root="copy", films_1="Other")))
+    assert {file.id for file in diff_trees(source, changed)} == {"b", "d", "e"}
+
+
+def test_snapshot_depths_follow_parents():
+    files, index = listing(filelist())
+    # NOTE: Depths must not depend on the path strings.
+    index.paths = {folder_id: PurePosixPath("x/y/z") for folder_id in index.paths}
+    snapshot = TreeSnapshot.from_listing(files, index)
+    assert snapshot.parents[0] == -1 and snapshot.depths[0] == 0
+    assert snapshot.size_of("root") == 105
+    assert snapshot.size_of("f1") == 65
+
+
+def test_plan_from_snapshot():
+    snapshot = TreeSnapshot.from_listing(*listing(filelist()))
+    plans = plan(snapshot, upper_limit=70, prefix="Films",
+                 exclude={"Films_2"})
+    assert [cluster.items for cluster in plans] == [["f1"], ["a"]]
+    assert [cluster.size for cluster in plans] == [65, 10]
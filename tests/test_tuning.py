@@ -0,0 +1,38 @@
+from internal.datatypes import Unit
+from internal.tuning import DEFAULTS, RcloneTuning, TuningHistory, tune
+
+
+def history(tmp_path, *runs):
+    past = TuningHistory(tmp_path / 'tuning.jsonl')
+    for tuning, nfiles, seconds in runs:
+        past.record('small', tuning, nbytes=nfiles * Unit.MB,
+                    nfiles=nfiles, seconds=seconds)
+    return past
+
+
+def test_best_by_files_per_second(tmp_path):
+    slow = RcloneTuning(transfers=16, checkers=32, chunk_size=8 * Unit.MB,
+                        tpslimit=8)
+    fast = RcloneTuning(transfers=48, checkers=96, chunk_size=8 * Unit.MB,
+                        tpslimit=16)
+    past = history(tmp_path, (slow, 1000, 100), (fast, 200, 10))
+    assert past.best('small') == fast
+    assert past.best('large') is None
+    assert TuningHistory.load(past.path).best('small') == fast
+
+
+def test_capped_transfers_not_reused(tmp_path):
+    capped = RcloneTuning(transfers=1, checkers=64, chunk_size=8 * Unit.MB,
+                          tpslimit=12, sa_count=2)
+    wide = RcloneTuning(transfers=32, checkers=64, chunk_size=8 * Unit.MB,
+                        tpslimit=12)
+    # NOTE: One file copied fast must not cap later clusters at 1.
+    past = history(tmp_path, (capped, 1, 0.1), (wide, 1000, 200))
+    best = past.best('small')
+    assert best.transfers == DEFAULTS['small'].transfers
+    assert best.sa_count is None
+
+    _, tuning = tune([Unit.MB] * 1000, history=past)
+    assert tuning.transfers == DEFAULTS['small'].transfers
+    _, tuning = tune([Unit.MB] * 3, history=past)
+    assert tuning.transfers == 3
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from internal.workqueue import ClusterQueue, LeaseLost
+
+
+def queue(tmp_path, **kwargs):
+    clusters = ClusterQueue(tmp_path / 'clusters.sqlite', **kwargs)
+    clusters.put("Films_1", {"size": 1})
+    return clusters
+
+
+def test_expired_lease_is_requeued(tmp_path):
+    clusters = queue(tmp_path, lease_seconds=0.05)
+    first = clusters.acquire()
+    assert first is not None and clusters.acquire() is None
+    time.sleep(0.1)
+
+    second = clusters.acquire()
+    assert second.name == "Films_1" and second.token != first.token
+    # NOTE: The first worker's token no longer counts.
+    assert not clusters.heartbeat(first)
+    assert not clusters.complete(first)
+    assert clusters.heartbeat(second)
+    assert clusters.complete(second)
+    assert clusters.counts() == {"done": 1}
+
+
+def test_failed_after_max_attempts(tmp_path):
+    clusters = queue(tmp_path, lease_seconds=0.05, max_attempts=2)
+    lease = clusters.acquire()
+    assert clusters.release(lease, error="boom")
+    assert clusters.counts() == {"pending": 1}
+    clusters.acquire()
+    time.sleep(0.1)
+    assert clusters.acquire() is None
+    assert clusters.counts() == {"failed": 1}
+
+
+def test_hold_keeps_and_completes(tmp_path):
+    clusters = queue(tmp_path, lease_seconds=0.2)
+    lease = clusters.acquire()
+    with clusters.hold(lease, every=0.02):
+        time.sleep(0.3)
+        lease.check()
+    assert clusters.counts() == {"done": 1}
+
+
+def test_hold_releases_on_error(tmp_path):
+    clusters = queue(tmp_path)
+    lease = clusters.acquire()
+    with pytest.raises(ValueError):
+        with clusters.hold(lease):
+            raise ValueError("copy failed")
+    assert clusters.counts() == {"pending": 1}
+
+
+def test_heartbeat_errors_lose_the_lease(tmp_path, monkeypatch):
+    clusters = queue(tmp_path, lease_seconds=0.2)
+    lease = clusters.acquire()
+    calls = []
+
+    def heartbeat(lease):
+        calls.append(lease)
+        raise OSError("database unavailable")
+
+    monkeypatch.setattr(clusters, "heartbeat", heartbeat)
+    with pytest.raises(LeaseLost):
+        with clusters.hold(lease, every=0.02):
+            assert lease.lost.wait(1)
+            # NOTE: Retried until the lease would have expired.
+            assert len(calls) > 1
+            with pytest.raises(LeaseLost):
+                lease.check()
+    assert clusters.counts() == {"leased": 1}